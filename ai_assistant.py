@@ -1,37 +1,68 @@
-import requests
+import hashlib
 import json
+import logging
 import os
+from context_builder import ContextBuilder
+from http_client import APIError, get_http_client
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 class AIAssistant:
     def __init__(self):
         self.openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
         self.model = "deepseek/deepseek-chat-v3-0324:free"
+        self.http = get_http_client()
+        self.http.configure_host(
+            self.base_url,
+            concurrency=int(os.getenv('OPENROUTER_MAX_CONCURRENCY', '16')),
+            timeout=float(os.getenv('OPENROUTER_TIMEOUT', '60'))
+        )
+        self.context_builder = ContextBuilder.from_env()
+        # Одинаковые промпты, пришедшие одновременно, отправляются в API один раз
+        self.generation_flight = SingleFlight('generation')
     
     async def generate_response(self, user_message, relevant_docs, user_context):
         """Генерация ответа с использованием DeepSeek"""
+        system_prompt, user_prompt = self._create_prompts(user_message, relevant_docs, user_context)
+        response = await self.generation_flight.do(
+            (self.model, system_prompt, user_prompt),
+            lambda: self._call_openrouter_api(system_prompt, user_prompt)
+        )
+        
+        return response
+
+    async def stream_response(self, user_message, relevant_docs, user_context):
+        """Потоковая генерация ответа: асинхронный генератор фрагментов текста"""
+        system_prompt, user_prompt = self._create_prompts(user_message, relevant_docs, user_context)
+        stream = self.generation_flight.stream(
+            (self.model, system_prompt, user_prompt),
+            lambda: self._stream_openrouter_api(system_prompt, user_prompt)
+        )
+        async for delta in stream:
+            yield delta
+
+    def _create_prompts(self, user_message, relevant_docs, user_context):
         context_text = self._format_context(relevant_docs)
         background_info = self._format_user_background(user_context)
         system_prompt = self._create_system_prompt()
         user_prompt = self._create_user_prompt(user_message, context_text, background_info)
-        response = await self._call_openrouter_api(system_prompt, user_prompt)
-        
-        return response
+        return system_prompt, user_prompt
     
     def _format_context(self, relevant_docs):
-        """Форматирование контекста"""
+        """Форматирование контекста в пределах бюджета токенов CONTEXT_MAX_TOKENS"""
         if not relevant_docs:
             return "Контекст не найден."
         
-        context_parts = []
-        for doc in relevant_docs:
-            context_parts.append(f"[{doc['metadata']['type']}] {doc['document']}")
-        
-        return "\n\n".join(context_parts)
+        context_text, stats = self.context_builder.build(relevant_docs)
+        logger.info(f"Контекст: {stats['docs_used']} из {stats['docs_in']} документов, {stats['tokens']} токенов "
+                    f"(повторов {stats['duplicates']}, обрезано {stats['truncated']}, отброшено {stats['dropped']})")
+        return context_text
     
     #Обработка информации о пользователе сгеннерирована ИИ
     def _format_user_background(self, user_context):
-        background_dict = user_context.get('background')
+        background_dict = user_context.background
         background_parts = []
         
         if background_dict.get('programming'):
@@ -45,16 +76,20 @@ class AIAssistant:
         if background_dict.get('education'):
             background_parts.append("У пользователя есть высшее образование")
         
-        experience = user_context.get('experience_level')
+        experience = user_context.experience_level
         if experience:
             background_parts.append(f"У пользователя следующий профессиональный уровень: {experience}")
         
-        interest_list = user_context.get('interests')
+        interest_list = user_context.interests
         if interest_list:
             background_parts.append(f"У пользователя следующие интересы: {', '.join(str(interest) for interest in interest_list)}")
             
         return " | ".join(background_parts) if background_parts else "Информация о бэкграунде пользователя отсутствует"
     
+    def profile_fingerprint(self, user_context):
+        """Короткий отпечаток профиля пользователя для ключа кэша ответов"""
+        return hashlib.sha1(self._format_user_background(user_context).encode('utf-8')).hexdigest()[:16]
+    
     #Системный промпт сгеннерирован ИИ
     def _create_system_prompt(self):
         """Создание системного промпта"""
@@ -91,7 +126,7 @@ class AIAssistant:
 Пожалуйста, дай полный и полезный ответ на основе предоставленной информации. Если нужно дать рекомендации по выбору программы или дисциплин, учитывай бэкграунд пользователя.
 """
     
-    async def _call_openrouter_api(self, system_prompt, user_prompt):
+    def _build_request(self, system_prompt, user_prompt, stream=False):
         headers = {
             "Authorization": f"Bearer {self.openrouter_api_key}",
             "Content-Type": "application/json"
@@ -106,8 +141,15 @@ class AIAssistant:
             "temperature": 0.7,
             "max_tokens": 1000
         }
+        if stream:
+            data["stream"] = True
+
+        return headers, data
+
+    async def _call_openrouter_api(self, system_prompt, user_prompt):
+        headers, data = self._build_request(system_prompt, user_prompt)
         
-        response = requests.post(
+        response = await self.http.post(
             f"{self.base_url}/chat/completions",
             headers=headers,
             json=data
@@ -117,4 +159,35 @@ class AIAssistant:
             result = response.json()
             return result["choices"][0]["message"]["content"]
         else:
-            raise Exception(f"Ошибка API: {response.status_code} - {response.text}")
+            raise APIError.from_response("Ошибка API", response)
+
+
+    async def _stream_openrouter_api(self, system_prompt, user_prompt):
+        """Чтение SSE-потока OpenRouter: фрагменты delta.content по мере генерации"""
+        headers, data = self._build_request(system_prompt, user_prompt, stream=True)
+
+        async with self.http.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            json=data
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise APIError.from_response("Ошибка API", response)
+
+            async for line in response.aiter_lines():
+                # Строки-комментарии (": OPENROUTER PROCESSING") и пустые разделители событий пропускаем
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    raise APIError(f"Ошибка API: {chunk['error']}")
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
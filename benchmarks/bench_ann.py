@@ -0,0 +1,67 @@
+"""Recall@k и задержка IVF-бэкенда относительно точного поиска.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_ann --size 100000 --nprobe 1,4,8,16,32
+
+Корпус - смесь гауссовых кластеров (ближе к реальным эмбеддингам, чем
+равномерный шум), запросы - зашумленные векторы корпуса.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vector_db import ExactIndex, IVFIndex, normalize_rows
+
+
+def clustered_corpus(size, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size)
+    corpus = centers[labels] + 0.6 * rng.standard_normal((size, dim), dtype=np.float32)
+    return normalize_rows(corpus)
+
+
+def timed_search(index, queries, top_k):
+    started = time.perf_counter()
+    results = [index.search(query.reshape(1, -1), top_k)[0][0] for query in queries]
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', default='1,4,8,16,32')
+    parser.add_argument('--noise', type=float, default=0.03, help="шум запросов относительно векторов корпуса")
+    args = parser.parse_args()
+
+    corpus = clustered_corpus(args.size, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    picked = corpus[rng.choice(args.size, args.queries, replace=False)]
+    queries = normalize_rows(picked + args.noise * rng.standard_normal(picked.shape, dtype=np.float32))
+
+    exact = ExactIndex()
+    exact.build(corpus)
+    truth, exact_ms = timed_search(exact, queries, args.top_k)
+    print(f"exact: {exact_ms:.3f} мс/запрос")
+
+    ivf = IVFIndex(nlist=args.nlist)
+    started = time.perf_counter()
+    ivf.build(corpus)
+    print(f"ivf: nlist={len(ivf.lists)}, построение {time.perf_counter() - started:.2f} с")
+
+    for nprobe in (int(value) for value in args.nprobe.split(',')):
+        ivf.nprobe = nprobe
+        found, ivf_ms = timed_search(ivf, queries, args.top_k)
+        recall = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(truth, found)])
+        print(f"ivf nprobe={nprobe:>3}: recall@{args.top_k}={recall:.3f}, {ivf_ms:.3f} мс/запрос "
+              f"(x{exact_ms / ivf_ms:.1f} к exact)")
+
+
+if __name__ == '__main__':
+    main()
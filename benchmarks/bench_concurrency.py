@@ -0,0 +1,77 @@
+"""Параллельные handle_message против локальной заглушки Mistral/OpenRouter.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_concurrency --users 20 --latency 0.5
+
+При неблокирующем HTTP-слое N одновременных сообщений обрабатываются примерно
+за время одного (эмбеддинг + генерация), а не за сумму задержек.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeUpdate
+from benchmarks.offline_index import build_offline_index
+from benchmarks.stub_servers import StubServer
+
+
+def make_bot(stub):
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark-token')
+    os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+    os.environ['OPENROUTER_API_KEY'] = 'benchmark-key'
+    os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+    os.environ['OPENROUTER_BASE_URL'] = stub.openrouter_url
+    os.environ['QUERY_CACHE_DB'] = ''
+
+    from main import ITMOChatBot
+    return ITMOChatBot()
+
+
+async def run(users, stub, index_dir):
+    from http_client import close_http_client
+
+    await build_offline_index(stub, index_dir)
+    bot = make_bot(stub)
+    if not await bot.vector_db.load_database():
+        raise SystemExit("Не удалось загрузить индекс, построенный для бенчмарка")
+    bot.initialized = True
+
+    # Разные тексты в двух прогонах, чтобы параллельный прогон не попадал в кэш эмбеддингов запросов
+    questions = [f"Сколько стоит обучение? Вопрос {i}" for i in range(2 * users)]
+
+    started = time.perf_counter()
+    for i, question in enumerate(questions[:users]):
+        await bot.handle_message(FakeUpdate(1000 + i, question), None)
+    sequential = time.perf_counter() - started
+
+    updates = [FakeUpdate(2000 + i, question) for i, question in enumerate(questions[users:])]
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.handle_message(update, None) for update in updates))
+    concurrent = time.perf_counter() - started
+
+    failed = sum(1 for update in updates if update.message.replies[-1].startswith("Извините"))
+    print(f"Микробатчинг поиска: {bot.search_batcher.stats()}")
+    await close_http_client()
+    return sequential, concurrent, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.5, help="задержка заглушки на запрос, с")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as index_dir:
+        sequential, concurrent, failed = asyncio.run(run(args.users, stub, index_dir))
+
+    per_message = 2 * args.latency
+    print(f"Сообщений: {args.users}, задержка upstream: {args.latency:.2f} с (2 вызова на сообщение)")
+    print(f"Последовательно: {sequential:.2f} с (сумма задержек {args.users * per_message:.2f} с)")
+    print(f"Параллельно:     {concurrent:.2f} с (максимальная задержка {per_message:.2f} с)")
+    print(f"Ошибок: {failed}")
+
+
+if __name__ == '__main__':
+    main()
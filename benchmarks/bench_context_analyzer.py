@@ -0,0 +1,125 @@
+"""Пропускная способность ContextAnalyzer.analyze_message на корпусе реалистичных сообщений.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_context_analyzer --messages 20000
+
+Сравнивает прежний анализатор (re.search по каждому шаблону с IGNORECASE на
+каждое сообщение) с одним предкомпилированным выражением и проверяет, что
+результаты анализа совпадают на всем корпусе.
+"""
+import argparse
+import random
+import re
+import time
+
+from main import ContextAnalyzer
+
+OPENINGS = [
+    "Здравствуйте!", "Добрый день.", "Привет!", "", "Подскажите, пожалуйста.", "У меня вопрос."
+]
+ABOUT = [
+    "Я программист, пишу на Python и Java уже несколько лет.",
+    "Работаю аналитиком данных, в основном SQL, Excel и Power BI.",
+    "Я студент третьего курса СПбГУ, бакалавр прикладной математики.",
+    "Руковожу командой разработки, занимаюсь планированием и roadmap продукта.",
+    "Новичок в машинном обучении, изучаю pandas и scikit-learn.",
+    "Senior data scientist, много лет работаю с PyTorch и NLP.",
+    "Я product manager в стартапе, отвечаю за метрики и growth.",
+    "Занимаюсь компьютерным зрением, использую OpenCV и YOLO.",
+    "Пишу диплом про языковые модели вроде GPT и BERT.",
+    "Backend-разработчик на Django, знаю git и структуры данных.",
+    "Без опыта в IT, до этого работал в продажах.",
+    "Закончил ИТМО, сейчас ведущий инженер в банке.",
+    "Интересуюсь исследованиями, есть публикации и статьи на конференциях.",
+    "Frontend на React и Vue, хочу перейти в ML.",
+    "",
+]
+QUESTIONS = [
+    "Сколько стоит обучение на программе AI Product?",
+    "Какие дисциплины есть в учебном плане первого семестра?",
+    "Сколько бюджетных мест на программе «Искусственный интеллект»?",
+    "Как поступить через портфолио или олимпиаду?",
+    "Какие карьерные перспективы и зарплаты после выпуска?",
+    "Какую программу вы мне посоветуете?",
+    "Есть ли курсы по computer vision и обработке изображений?",
+    "Можно ли совмещать учебу с работой?",
+    "Что лучше выбрать для развития в NLP и чат-ботах?",
+    "Какие выборные дисциплины по deep learning?",
+]
+
+
+def make_corpus(size, seed=0):
+    rng = random.Random(seed)
+    return [
+        ' '.join(part for part in (rng.choice(OPENINGS), rng.choice(ABOUT), rng.choice(QUESTIONS)) if part)
+        for _ in range(size)
+    ]
+
+
+class LegacyContextAnalyzer(ContextAnalyzer):
+    """Прежняя реализация: отдельный re.search на каждый шаблон"""
+
+    def analyze_message(self, message: str) -> dict:
+        message_lower = message.lower()
+
+        analysis = {
+            'background': {},
+            'experience_level': None,
+            'interests': [],
+            'education_mentioned': False
+        }
+
+        for category, patterns in self.background_patterns.items():
+            detected = any(re.search(pattern, message_lower, re.IGNORECASE) for pattern in patterns)
+            if category == 'education':
+                analysis['education_mentioned'] = detected
+            else:
+                analysis['background'][category] = detected
+
+        for level, pattern in self.experience_patterns.items():
+            if re.search(pattern, message_lower, re.IGNORECASE):
+                analysis['experience_level'] = level
+                break
+
+        for interest, pattern in self.interest_patterns.items():
+            if re.search(pattern, message_lower, re.IGNORECASE):
+                analysis['interests'].append(interest)
+
+        return analysis
+
+
+def best_of(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages)
+    legacy = LegacyContextAnalyzer()
+    analyzer = ContextAnalyzer()
+
+    mismatches = [message for message in corpus
+                  if legacy.analyze_message(message) != analyzer.analyze_message(message)]
+    if mismatches:
+        raise SystemExit(f"Результаты расходятся на {len(mismatches)} сообщениях, например: {mismatches[0]!r}")
+
+    old = best_of(lambda: [legacy.analyze_message(message) for message in corpus], args.repeats)
+    new = best_of(lambda: [analyzer.analyze_message(message) for message in corpus], args.repeats)
+    print(f"сообщений: {len(corpus)}, результаты совпадают")
+    print(f"{'':>6} {'сообщ/с':>10} {'мкс/сообщ':>10}")
+    print(f"{'old':>6} {len(corpus) / old:>10.0f} {old / len(corpus) * 1e6:>10.1f}")
+    print(f"{'new':>6} {len(corpus) / new:>10.0f} {new / len(corpus) * 1e6:>10.1f}")
+    print(f"ускорение: {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
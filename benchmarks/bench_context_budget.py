@@ -0,0 +1,89 @@
+"""Задержка ответа в зависимости от бюджета контекста, против заглушки LLM.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_context_budget --budgets 500,1000,1500,3000 --prefill 0.5
+
+Заглушка отвечает тем дольше, чем длиннее промпт (prefill секунд на 1000
+токенов), как реальные LLM. Прежнее поведение - весь найденный контекст без
+ограничений и без удаления повторов.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.stub_servers import StubServer
+
+
+def make_results(seed):
+    """Выдача поиска: длинные документы учебного плана и FAQ, частичные повторы"""
+    curriculum = ', '.join(f"Дисциплина {seed}-{i} ({1 + i % 4})" for i in range(120))
+    faq = ' '.join(f"Вопрос {i}: можно ли поступить без экзаменов? Ответ: да, через портфолио." for i in range(40))
+    docs = [
+        ('cost', f"Стоимость обучения на программе {seed}: 599 000 рублей в год", 0.82),
+        ('curriculum', f"Выборные дисциплины: {curriculum}", 0.74),
+        ('faq', faq, 0.69),
+        ('curriculum', f"Выборные дисциплины: {curriculum}, Дополнительная дисциплина", 0.66),
+        ('career', "Выпускники работают ML-инженерами, аналитиками данных и менеджерами AI-продуктов. " * 10, 0.51),
+    ]
+    return [
+        {'id': i, 'document': text, 'metadata': {'type': doc_type, 'program': 'ai'}, 'score': score}
+        for i, (doc_type, text, score) in enumerate(docs)
+    ]
+
+
+async def measure(assistant, requests, concurrency):
+    from session_store import UserSession
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await assistant.generate_response(f"Вопрос {i}", make_results(i), UserSession(user_id=i))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+async def run(args):
+    from ai_assistant import AIAssistant
+    from context_builder import ContextBuilder
+    from http_client import close_http_client
+
+    assistant = AIAssistant()
+    configs = [('без ограничений', ContextBuilder(max_tokens=10 ** 9, dedup_threshold=2.0))]
+    configs += [(f"бюджет {budget}", ContextBuilder(max_tokens=budget)) for budget in args.budgets]
+
+    print(f"{'':>16} {'токенов':>8} {'среднее, с':>11} {'p95, с':>8}")
+    try:
+        for name, builder in configs:
+            assistant.context_builder = builder
+            mean, p95 = await measure(assistant, args.requests, args.concurrency)
+            print(f"{name:>16} {builder.stats()['avg_tokens']:>8.0f} {mean:>11.3f} {p95:>8.3f}")
+    finally:
+        await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', default='500,1000,1500,3000')
+    parser.add_argument('--prefill', type=float, default=0.5, help="с на 1000 токенов промпта")
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    args.budgets = [int(value) for value in args.budgets.split(',')]
+
+    with StubServer(latency=args.latency, prefill_latency=args.prefill) as stub:
+        os.environ['OPENROUTER_API_KEY'] = 'benchmark-key'
+        os.environ['OPENROUTER_BASE_URL'] = stub.openrouter_url
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Разбор учебного плана на синтетическом PDF в 500 страниц.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_curriculum_parser --pages 500
+
+Сравнивает прежний разбор (весь текст PDF склеивается в одну строку, на каждой
+строке заново приводятся к нижнему регистру все ключевые слова категорий) с
+потоковым разбором по страницам и строкам с предкомпилированными шаблонами.
+Отдельно измеряется разбор уже извлеченного текста, чтобы время PyPDF2 не
+скрывало разницу. Пиковая память - по tracemalloc.
+"""
+import argparse
+import contextlib
+import io
+import re
+import time
+import tracemalloc
+from collections import defaultdict
+
+import PyPDF2
+
+from benchmarks.fixture_site import curriculum_pages, make_pdf
+from data_parser import CURRICULUM_CATEGORIES, extract_curriculum, iter_curriculum_courses
+
+
+def legacy_parse_text(text):
+    """Прежний цикл по строкам из DataParser.parse_curriculum_2"""
+    curriculum = defaultdict(list)
+    current_category = None
+    course_line_pattern = re.compile(r"^(\d)([А-Яа-яA-Za-z /().-]+)\s+\d{4,}$")
+    for line in text.split('\n'):
+        stripped = line.strip()
+
+        if not stripped:
+            continue
+        for key, keywords in CURRICULUM_CATEGORIES.items():
+            if any(kw.lower() in stripped.lower() for kw in keywords):
+                current_category = key
+                break
+        match = course_line_pattern.match(stripped)
+        if current_category and match:
+            semester = int(match.group(1))
+            title = match.group(2).strip()
+            curriculum[current_category].append({"semester": semester, "title": title})
+    return dict(curriculum)
+
+
+def legacy_extract(content):
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return legacy_parse_text(text)
+
+
+def streaming_parse_text(page_texts):
+    curriculum = defaultdict(list)
+    lines = (line.strip() for text in page_texts for line in text.split('\n'))
+    for category, course in iter_curriculum_courses(line for line in lines if line):
+        curriculum[category].append(course)
+    return dict(curriculum)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def synthetic_pages(pages, lines_per_page):
+    """Учебный план на pages страниц с заголовками категорий по ходу документа"""
+    courses = pages * lines_per_page
+    lines = []
+    for block in curriculum_pages(courses, lines_per_page=courses + 10):
+        lines.extend(block)
+    headers = ['Микромодули Soft Skills', 'Блок 2. Практика', 'Универсальная (надпрофессиональная) подготовка']
+    for i, header in enumerate(headers, start=1):
+        lines.insert(len(lines) * i // (len(headers) + 1), header)
+    return [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--lines-per-page', type=int, default=50)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages, args.lines_per_page)
+    page_texts = ['\n'.join(lines) for lines in pages]
+    pdf = make_pdf(pages)
+    print(f"страниц: {len(pages)}, строк: {sum(map(len, pages))}, PDF: {len(pdf) / 1e6:.1f} МБ")
+
+    print(f"{'':>22} {'время, с':>9} {'пик памяти, МБ':>15}")
+    rows = [
+        ('текст: old', legacy_parse_text, '\n'.join(page_texts)),
+        ('текст: new', streaming_parse_text, page_texts),
+        ('PDF: old', legacy_extract, pdf),
+        ('PDF: new', extract_curriculum, pdf, 'bench'),
+    ]
+    results = []
+    for name, func, *func_args in rows:
+        result, elapsed, peak = measure(func, *func_args)
+        results.append(result)
+        print(f"{name:>22} {elapsed:>9.2f} {peak / 1e6:>15.1f}")
+
+    if any(result != results[0] for result in results):
+        raise SystemExit("Потоковый разбор дал другой учебный план")
+    print(f"дисциплин: {sum(map(len, results[0].values()))}, результаты совпадают")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Пропускная способность получения эмбеддингов при создании базы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_embedding_pipeline --docs 1000 --latency 0.2 --error-rate 0.05
+
+Сравнивает прежний последовательный цикл батчами по 10 с EmbeddingPipeline
+(батчи по лимиту токенов, несколько батчей одновременно, повторы при 429/5xx).
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_servers import StubServer
+
+
+def make_documents(count):
+    return [
+        f"Вопрос по программе Искусственный интеллект №{i}: как поступить без экзаменов? "
+        f"Ответ: через олимпиаду, портфолио или конкурс достижений. " * (1 + i % 5)
+        for i in range(count)
+    ]
+
+
+async def run_sequential(db, documents):
+    embedded, failed = 0, 0
+    started = time.perf_counter()
+    for i in range(0, len(documents), 10):
+        batch = documents[i:i + 10]
+        try:
+            embedded += len(await db._get_embeddings(batch))
+        except Exception:
+            failed += len(batch)
+    return embedded, failed, time.perf_counter() - started
+
+
+async def run(args, stub):
+    from embedding_pipeline import EmbeddingPipeline
+    from http_client import close_http_client
+    from vector_db import VectorDB
+
+    db = VectorDB()
+    documents = make_documents(args.docs)
+
+    embedded, failed, elapsed = await run_sequential(db, documents)
+    print(f"Последовательно, батчи по 10: {embedded / elapsed:.1f} док/с, "
+          f"ошибок {failed}, {elapsed:.2f} с")
+
+    pipeline = EmbeddingPipeline.from_env(db._get_embeddings)
+    pipeline.backoff_base = 0.1
+    _, failures, stats = await pipeline.run(documents)
+    print(f"EmbeddingPipeline: {stats['docs_per_sec']:.1f} док/с, батчей {stats['batches']}, "
+          f"повторов {stats['retries']}, ошибок {len(failures)}, {stats['elapsed_s']:.2f} с")
+
+    await close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency, error_rate=args.error_rate) as stub:
+        os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+        os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+        os.environ.setdefault('QUERY_CACHE_DB', '')
+        asyncio.run(run(args, stub))
+
+
+if __name__ == '__main__':
+    main()
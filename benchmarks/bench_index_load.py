@@ -0,0 +1,53 @@
+"""Время холодной загрузки базы: documents.json + embeddings.npy против data/index.vdb.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_index_load --sizes 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from index_store import open_index, write_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--dim', type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'docs':>9} {'json+npy, мс':>14} {'index.vdb, мс':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(value) for value in args.sizes.split(',')):
+            embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+            documents = [f"Вопрос по программе Искусственный интеллект №{i}: как поступить?" for i in range(size)]
+            metadata = [{'program': 'ai', 'type': 'faq', 'title': 'Искусственный интеллект'} for _ in range(size)]
+
+            json_path = os.path.join(tmp, 'documents.json')
+            npy_path = os.path.join(tmp, 'embeddings.npy')
+            index_path = os.path.join(tmp, 'index.vdb')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({'documents': documents, 'metadata': metadata}, f, ensure_ascii=False, indent=2)
+            np.save(npy_path, embeddings.astype(np.float64))
+            write_index(index_path, embeddings, documents, metadata)
+
+            started = time.perf_counter()
+            with open(json_path, 'r', encoding='utf-8') as f:
+                json.load(f)
+            np.load(npy_path)
+            legacy_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            open_index(index_path)
+            index_ms = (time.perf_counter() - started) * 1000
+
+            print(f"{size:>9} {legacy_ms:>14.1f} {index_ms:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
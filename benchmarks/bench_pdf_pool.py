@@ -0,0 +1,94 @@
+"""Разбор учебных планов в пуле процессов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pdf_pool --programs 8 --courses 4000
+
+Сравнивает время разбора N PDF с одним процессом-исполнителем и с пулом на все
+ядра, время разбора одного PDF и максимальную задержку event loop во время
+парсинга (насколько бот перестает отвечать). Кэш HTTP отключен, парсер пишет
+файлы во временный каталог.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.fixture_site import FixtureSite, curriculum_pages, make_pdf
+
+
+async def measure_loop_lag(stop, interval=0.01):
+    """Максимальное опоздание периодической задачи за время работы"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def scrape(site, workers):
+    from data_parser import DataParser
+
+    os.environ['PDF_WORKERS'] = str(workers)
+    parser = DataParser(programs=site.programs)
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, curricula = await parser.parse_programs()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return curricula, elapsed, await lag
+
+
+async def run(site, workers):
+    from http_client import close_http_client
+
+    try:
+        print(f"{'исполнителей':>14} {'время, с':>9} {'задержка loop, мс':>18}")
+        results = []
+        for count in (1, workers):
+            curricula, elapsed, lag = await scrape(site, count)
+            results.append(curricula)
+            print(f"{count:>14} {elapsed:>9.2f} {lag * 1000:>18.0f}")
+    finally:
+        await close_http_client()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--programs', type=int, default=8)
+    parser.add_argument('--courses', type=int, default=4000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from data_parser import extract_curriculum
+
+    os.environ['HTTP_CACHE_DIR'] = ''
+    program_keys = [f"program_{i}" for i in range(args.programs)]
+    repo_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, FixtureSite(program_keys, courses=args.courses) as site:
+        os.chdir(tmp)
+        try:
+            pdf = make_pdf(curriculum_pages(args.courses))
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                single = extract_curriculum(pdf, 'single')
+            print(f"один PDF ({sum(map(len, single.values()))} дисциплин): "
+                  f"{time.perf_counter() - started:.2f} с")
+
+            sequential, pooled = asyncio.run(run(site, args.workers))
+        finally:
+            os.chdir(repo_dir)
+
+    if sequential != pooled or set(pooled) != set(program_keys):
+        raise SystemExit("Учебные планы в пуле процессов разобраны иначе")
+    print(f"учебных планов: {len(pooled)}, у каждой программы свой, результаты совпадают")
+
+
+if __name__ == '__main__':
+    main()
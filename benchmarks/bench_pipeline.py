@@ -0,0 +1,315 @@
+"""Воспроизводимый прогон всего конвейера сообщений и компонентов с результатами в JSON.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pipeline --concurrency 1,4,16,64 --messages 200 \\
+        --embed-latency lognormal:0.15,0.4 --chat-latency lognormal:0.8,0.5 --output before.json
+    python -m benchmarks.bench_pipeline ... --output after.json --compare before.json
+
+Вопросы абитуриентов из benchmarks/questions.txt в случайном (по --seed)
+порядке проходят через ITMOChatBot.handle_message с поддельными Update, внешние
+API заменены заглушками с заданным распределением задержки (см.
+stub_servers.parse_latency). На каждом уровне параллельности бот создается
+заново (кэши холодные) и прогон делается дважды: для времени и, под
+tracemalloc, для пикового объема памяти. Индекс строится во временном каталоге
+из data/programs_data.json с эмбеддингами той же заглушки (benchmarks/offline_index.py).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.fakes import FakeUpdate
+from benchmarks.offline_index import build_offline_index
+from benchmarks.stub_servers import StubServer, parse_latency
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'questions.txt')
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def summarize(values):
+    """Среднее и квантили списка значений"""
+    if not values:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    values = sorted(values)
+
+    def quantile(q):
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    return {
+        'mean': sum(values) / len(values),
+        'p50': quantile(0.5),
+        'p95': quantile(0.95),
+        'p99': quantile(0.99),
+        'max': values[-1]
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def configure_env(args, stub):
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark-token')
+    os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+    os.environ['OPENROUTER_API_KEY'] = 'benchmark-key'
+    os.environ['EMBEDDING_PROVIDER'] = 'mistral'
+    os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+    os.environ['OPENROUTER_BASE_URL'] = stub.openrouter_url
+    os.environ['QUERY_CACHE_DB'] = ''
+    os.environ['SESSION_DB_PATH'] = ''
+    os.environ['METRICS_ENABLED'] = '1'
+    os.environ['STREAM_RESPONSES'] = '1' if args.stream else '0'
+
+
+async def make_bot():
+    from main import ITMOChatBot
+    from metrics import get_metrics
+
+    get_metrics().reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = ITMOChatBot()
+        # Эмбеддинги документов и запросов должны быть от одной модели, иначе результаты бессмысленны
+        stale_reason = bot.vector_db.get_stale_reason()
+        if stale_reason is not None:
+            raise SystemExit(f"Индекс не подходит для бенчмарка: {stale_reason}")
+        if not await bot.vector_db.load_database():
+            raise SystemExit("Не удалось загрузить индекс, построенный для бенчмарка")
+    bot.initialized = True
+    return bot
+
+
+async def replay(bot, messages, concurrency, users):
+    """Закрытый цикл: concurrency пользователей-воркеров по очереди берут следующее сообщение"""
+    latencies = []
+    outcomes = {'ok': 0, 'busy': 0, 'error': 0}
+    queue = list(enumerate(messages))
+    queue.reverse()
+
+    async def worker():
+        while queue:
+            i, text = queue.pop()
+            update = FakeUpdate(10000 + i % users, text)
+            started = time.perf_counter()
+            await bot.handle_message(update, None)
+            latencies.append(time.perf_counter() - started)
+            reply = update.message.replies[-1] if update.message.replies else ''
+            if reply.startswith("⏳"):
+                outcomes['busy'] += 1
+            elif reply.startswith("Извините"):
+                outcomes['error'] += 1
+            else:
+                outcomes['ok'] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, outcomes
+
+
+async def run_level(args, stub, messages, concurrency):
+    from http_client import close_http_client
+    from metrics import get_metrics
+
+    # Одинаковая последовательность задержек заглушки на каждом уровне и в каждом прогоне
+    stub.latency = parse_latency(args.embed_latency, args.seed)
+    stub.chat_latency = parse_latency(args.chat_latency, args.seed + 1)
+    requests_before = stub.requests.copy()
+    bot = await make_bot()
+    elapsed, latencies, outcomes = await replay(bot, messages, concurrency, args.users)
+    snapshot = get_metrics().snapshot()
+    await close_http_client()
+    upstream = {path: count - requests_before[path] for path, count in stub.requests.items()
+                if count != requests_before[path]}
+
+    memory = {'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    if args.memory:
+        stub.latency = parse_latency(args.embed_latency, args.seed)
+        stub.chat_latency = parse_latency(args.chat_latency, args.seed + 1)
+        tracemalloc.start()
+        try:
+            bot = await make_bot()
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await replay(bot, messages, concurrency, args.users)
+            memory['traced_peak_mb'] = (tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20
+        finally:
+            tracemalloc.stop()
+            await close_http_client()
+
+    return {
+        'concurrency': concurrency,
+        'messages': len(messages),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(messages) / elapsed,
+        'latency_s': summarize(latencies),
+        'outcomes': outcomes,
+        'upstream_calls': upstream,
+        'stages_s': snapshot['stages'],
+        'memory': memory
+    }
+
+
+def time_calls(func, items, repeat):
+    """Время одного вызова func(item), мкс"""
+    durations = []
+    for _ in range(repeat):
+        for item in items:
+            started = time.perf_counter_ns()
+            func(item)
+            durations.append((time.perf_counter_ns() - started) / 1000)
+    return summarize(durations)
+
+
+async def run_components(args, corpus):
+    from http_client import close_http_client
+    from main import ContextAnalyzer
+
+    bot = await make_bot()
+    results = {}
+
+    analyzer = ContextAnalyzer()
+    results['analyze_message_us'] = time_calls(analyzer.analyze_message, corpus, args.repeat)
+
+    # Эмбеддинги запросов прогреваются заранее: замеряется поиск без сети
+    vector_db = bot.vector_db
+    await vector_db.embed_queries(corpus)
+    durations = []
+    for _ in range(args.repeat):
+        for question in corpus:
+            started = time.perf_counter_ns()
+            await vector_db.search(question)
+            durations.append((time.perf_counter_ns() - started) / 1000)
+    results['vector_db_search_us'] = summarize(durations)
+
+    with open('data/programs_data.json', encoding='utf-8') as f:
+        programs_data = json.load(f)
+    curricula = {}
+    for program_key in programs_data:
+        path = f'data/curriculum_{program_key}.json'
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                curricula[program_key] = json.load(f)
+    programs = [(key, data, curricula.get(key, {})) for key, data in programs_data.items()]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['create_documents_from_program_us'] = time_calls(
+            lambda program: vector_db._create_documents_from_program(*program), programs, args.repeat * 10
+        )
+
+    await close_http_client()
+    return results
+
+
+def change(new, old):
+    return f"{(new - old) / old:+.1%}" if old else "n/a"
+
+
+def print_comparison(result, baseline):
+    print(f"\nСравнение с {baseline.get('commit') or 'базовым прогоном'}:")
+    levels = {level['concurrency']: level for level in baseline.get('pipeline', [])}
+    for level in result['pipeline']:
+        old = levels.get(level['concurrency'])
+        if old is None:
+            continue
+        parts = [
+            f"rps {change(level['throughput_rps'], old['throughput_rps'])}",
+            f"p95 {change(level['latency_s']['p95'], old['latency_s']['p95'])}",
+            f"p99 {change(level['latency_s']['p99'], old['latency_s']['p99'])}"
+        ]
+        if 'traced_peak_mb' in level['memory'] and 'traced_peak_mb' in old['memory']:
+            parts.append(f"память {change(level['memory']['traced_peak_mb'], old['memory']['traced_peak_mb'])}")
+        print(f"  параллельность {level['concurrency']:>3}: " + ', '.join(parts))
+    for name, stats in result['components'].items():
+        old = baseline.get('components', {}).get(name)
+        if old is not None:
+            print(f"  {name}: среднее {change(stats['mean'], old['mean'])}, p95 {change(stats['p95'], old['p95'])}")
+
+
+async def run(args):
+    corpus = load_corpus()
+    rng = random.Random(args.seed)
+    messages = [rng.choice(corpus) for _ in range(args.messages)]
+
+    with StubServer(token_latency=args.token_latency) as stub, tempfile.TemporaryDirectory() as index_dir:
+        configure_env(args, stub)
+        await build_offline_index(stub, index_dir)
+        import main  # noqa: F401 - настраивает logging при импорте
+        logging.getLogger().setLevel(logging.WARNING)
+
+        pipeline = []
+        for concurrency in args.concurrency:
+            level = await run_level(args, stub, messages, concurrency)
+            pipeline.append(level)
+            latency = level['latency_s']
+            memory = level['memory'].get('traced_peak_mb')
+            print(f"параллельность {concurrency:>3}: {level['throughput_rps']:7.2f} сообщ./с, "
+                  f"p50 {latency['p50']:.3f} с, p95 {latency['p95']:.3f} с, p99 {latency['p99']:.3f} с, "
+                  f"пик памяти {f'{memory:.1f} МБ' if memory is not None else '-'}, {level['outcomes']}")
+
+        components = await run_components(args, corpus) if args.components else {}
+        for name, stats in components.items():
+            print(f"{name}: среднее {stats['mean']:.1f}, p50 {stats['p50']:.1f}, p95 {stats['p95']:.1f}")
+
+    commit, dirty = git_revision()
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'pipeline': pipeline,
+        'components': components
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,4,16,64', help="уровни параллельности через запятую")
+    parser.add_argument('--messages', type=int, default=200, help="сообщений на уровень")
+    parser.add_argument('--users', type=int, default=50, help="разных пользователей в прогоне")
+    parser.add_argument('--embed-latency', default='lognormal:0.15,0.4', help="задержка заглушки Mistral, с")
+    parser.add_argument('--chat-latency', default='lognormal:0.8,0.5', help="задержка заглушки OpenRouter, с")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="пауза между фрагментами SSE, с")
+    parser.add_argument('--stream', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--memory', action=argparse.BooleanOptionalAction, default=True,
+                        help="повторный прогон под tracemalloc для пиковой памяти")
+    parser.add_argument('--components', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--repeat', type=int, default=20, help="повторов корпуса в микробенчмарках")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результаты: {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Пользователи, засыпающие бота сообщениями: нагрузка на upstream и очередь планировщика.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_scheduler --users 20 --messages 5 --max-concurrent 4 --queue 30
+
+Каждый пользователь отправляет messages разных вопросов подряд, не дожидаясь
+ответов. Сравниваются режимы USER_REQUEST_MODE: serial (по очереди, лишние
+сообщения получают ответ "подождите") и latest (новое сообщение отменяет
+предыдущее). Видно, сколько вызовов генерации дошло до API, сколько ответов
+отклонено и сколько ждали в очереди.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeUpdate
+from benchmarks.offline_index import build_offline_index
+from benchmarks.stub_servers import StubServer
+
+
+async def run_mode(args, stub, mode):
+    from http_client import close_http_client
+    from main import ITMOChatBot
+
+    os.environ['USER_REQUEST_MODE'] = mode
+    bot = ITMOChatBot()
+    if not await bot.vector_db.load_database():
+        raise SystemExit("Не удалось загрузить индекс, построенный для бенчмарка")
+    bot.initialized = True
+
+    updates = []
+    for message in range(args.messages):
+        for user in range(args.users):
+            updates.append(FakeUpdate(5000 + user, f"{mode}: вопрос {message} пользователя {user} о стоимости"))
+
+    before = stub.requests['/api/v1/chat/completions']
+    started = time.perf_counter()
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(bot.handle_message(update, None)))
+        await asyncio.sleep(args.interval)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    busy = sum(1 for update in updates if update.message.replies and update.message.replies[-1].startswith("⏳"))
+    await close_http_client()
+    return {
+        'elapsed': elapsed,
+        'generations': stub.requests['/api/v1/chat/completions'] - before,
+        'busy': busy,
+        'scheduler': bot.scheduler.stats()
+    }
+
+
+async def run(args, stub, index_dir):
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark-token')
+    os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+    os.environ['OPENROUTER_API_KEY'] = 'benchmark-key'
+    os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+    os.environ['OPENROUTER_BASE_URL'] = stub.openrouter_url
+    os.environ['QUERY_CACHE_DB'] = ''
+    os.environ['SESSION_DB_PATH'] = ''
+    os.environ['STREAM_RESPONSES'] = '0'
+    os.environ['MAX_CONCURRENT_REQUESTS'] = str(args.max_concurrent)
+    os.environ['REQUEST_QUEUE_SIZE'] = str(args.queue)
+
+    await build_offline_index(stub, index_dir)
+    return {mode: await run_mode(args, stub, mode) for mode in ('serial', 'latest')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=5, help="сообщений подряд от каждого пользователя")
+    parser.add_argument('--interval', type=float, default=0.005, help="пауза между входящими сообщениями, с")
+    parser.add_argument('--max-concurrent', type=int, default=4)
+    parser.add_argument('--queue', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.3, help="задержка заглушки на запрос, с")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as index_dir:
+        results = asyncio.run(run(args, stub, index_dir))
+
+    total = args.users * args.messages
+    print(f"Сообщений: {total} ({args.users} пользователей по {args.messages}), "
+          f"лимит {args.max_concurrent}, очередь {args.queue}")
+    print(f"{'режим':>8} {'время, с':>9} {'генераций':>10} {'занято':>7} {'отменено':>9} "
+          f"{'макс. очередь':>14} {'ожидание p95, с':>16}")
+    for mode, result in results.items():
+        stats = result['scheduler']
+        print(f"{mode:>8} {result['elapsed']:>9.2f} {result['generations']:>10} {result['busy']:>7} "
+              f"{stats['superseded']:>9} {stats['max_waiting']:>14} {stats['p95_wait']:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Парсинг программ на локальном сайте-заглушке: параллельная загрузка и HTTP-кэш.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_scraper --programs 24 --latency 0.2
+
+Сравнивает последовательную загрузку без кэша, параллельную загрузку с пустым
+кэшем, повторный запуск (все ответы 304) и запуск после изменения одного
+учебного плана. Парсер пишет data/ во временный каталог.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.fixture_site import FixtureSite
+
+
+async def scrape(site, concurrency, cache_dir):
+    from data_parser import DataParser
+
+    os.environ['SCRAPER_CONCURRENCY'] = str(concurrency)
+    os.environ['HTTP_CACHE_DIR'] = cache_dir
+    parser = DataParser(programs=site.programs)
+    site.responses.clear()
+    started = time.perf_counter()
+    # Подробный вывод парсера не нужен в таблице результатов
+    with contextlib.redirect_stdout(io.StringIO()):
+        programs_data, _ = await parser.parse_programs()
+    elapsed = time.perf_counter() - started
+    return programs_data, elapsed, dict(site.responses)
+
+
+async def run(args, site):
+    from http_client import close_http_client
+
+    cache_dir = os.path.abspath('http_cache')
+    runs = [
+        ('последовательно, без кэша', 1, ''),
+        ('параллельно, пустой кэш', args.concurrency, cache_dir),
+        ('параллельно, повторно', args.concurrency, cache_dir),
+        ('изменен 1 учебный план', args.concurrency, cache_dir),
+    ]
+    results = []
+    try:
+        for name, concurrency, cache in runs:
+            if name.startswith('изменен'):
+                site.update_program(next(iter(site.programs)))
+            programs_data, elapsed, responses = await scrape(site, concurrency, cache)
+            results.append(programs_data)
+            print(f"{name:>28} {elapsed:>8.2f} {responses.get(200, 0):>6} {responses.get(304, 0):>6}")
+    finally:
+        await close_http_client()
+
+    if not all(data == results[0] for data in results):
+        raise SystemExit("Результаты парсинга с кэшем и без него расходятся")
+    print(f"программ спарсено: {len(results[0])}, результаты совпадают")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--programs', type=int, default=24)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    program_keys = [f"program_{i}" for i in range(args.programs)]
+    repo_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, FixtureSite(program_keys, args.latency, args.courses) as site:
+        os.chdir(tmp)
+        try:
+            print(f"{'':>28} {'время, с':>8} {'200':>6} {'304':>6}")
+            asyncio.run(run(args, site))
+        finally:
+            os.chdir(repo_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Микробенчмарк скоринга VectorDB.search на синтетических корпусах.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_search --sizes 1000,10000,100000,1000000 --dim 1024
+
+Сравнивает прежний путь (sklearn cosine_similarity по float64-матрице + полный
+argsort) с предварительно нормированной float32-матрицей и argpartition.
+Корпус на 1M x 1024 занимает ~4 ГБ во float32.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vector_db import normalize_rows, top_k_indices
+
+
+def synthetic_corpus(size, dim, seed=0, chunk=50000):
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, chunk):
+        end = min(size, start + chunk)
+        matrix[start:end] = rng.standard_normal((end - start, dim), dtype=np.float32)
+    return matrix
+
+
+def best_of(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="не запускать старый путь на корпусах больше этого размера")
+    args = parser.parse_args()
+
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        cosine_similarity = None
+
+    query = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+    print(f"{'docs':>9} {'old, мс':>10} {'new, мс':>10} {'память old/new, МБ':>20}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        corpus = synthetic_corpus(size, args.dim)
+        matrix = normalize_rows(corpus)
+        query_vector = normalize_rows(query)
+
+        def new_path():
+            return top_k_indices(matrix @ query_vector, args.top_k)
+
+        new_ms = best_of(new_path, args.repeats) * 1000
+        legacy_ms = float('nan')
+        if cosine_similarity is not None and size <= args.legacy_max:
+            legacy = corpus.astype(np.float64)
+            legacy_query = query.astype(np.float64).reshape(1, -1)
+
+            def legacy_path():
+                similarities = cosine_similarity(legacy_query, legacy)[0]
+                return np.argsort(similarities)[::-1][:args.top_k]
+
+            legacy_ms = best_of(legacy_path, args.repeats) * 1000
+            assert set(legacy_path()) == set(new_path())
+            del legacy
+
+        print(f"{size:>9} {legacy_ms:>10.2f} {new_ms:>10.2f} "
+              f"{size * args.dim * 8 / 2 ** 20:>10.0f}/{matrix.nbytes / 2 ** 20:.0f}")
+        del corpus, matrix
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Всплеск одинаковых вопросов: сколько вызовов upstream доходит до API.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_single_flight --users 50 --questions 3 --latency 0.3
+
+users пользователей одновременно задают один из questions вопросов. Кэш
+ответов пуст, поэтому без объединения каждый вопрос дал бы свой вызов
+генерации; с объединением одинаковые вызовы эмбеддингов, поиска и генерации
+выполняются один раз на вопрос, а ответы пользователей совпадают.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fakes import FakeUpdate
+from benchmarks.offline_index import build_offline_index
+from benchmarks.stub_servers import StubServer
+
+
+async def run(args, stub, index_dir):
+    from http_client import close_http_client
+
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark-token')
+    os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+    os.environ['OPENROUTER_API_KEY'] = 'benchmark-key'
+    os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+    os.environ['OPENROUTER_BASE_URL'] = stub.openrouter_url
+    os.environ['QUERY_CACHE_DB'] = ''
+    os.environ['SESSION_DB_PATH'] = ''
+
+    await build_offline_index(stub, index_dir)
+    from main import ITMOChatBot
+    bot = ITMOChatBot()
+    if not await bot.vector_db.load_database():
+        raise SystemExit("Не удалось загрузить индекс, построенный для бенчмарка")
+    bot.initialized = True
+
+    questions = [f"Сколько стоит обучение на программе? Вариант {i}" for i in range(args.questions)]
+    updates = [FakeUpdate(3000 + i, questions[i % args.questions]) for i in range(args.users)]
+
+    before = stub.requests.copy()
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.handle_message(update, None) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    answers = {}
+    for i, update in enumerate(updates):
+        answers.setdefault(questions[i % args.questions], set()).add(update.message.replies[-1])
+
+    flights = (bot.vector_db.embed_flight, bot.search_batcher.flight, bot.ai_assistant.generation_flight)
+    stats = {flight.name: flight.stats() for flight in flights}
+    await close_http_client()
+    upstream = {path: count - before[path] for path, count in stub.requests.items() if count != before[path]}
+    return elapsed, upstream, stats, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--questions', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.3, help="задержка заглушки на запрос, с")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as index_dir:
+        elapsed, upstream, stats, answers = asyncio.run(run(args, stub, index_dir))
+
+    print(f"Сообщений: {args.users}, разных вопросов: {args.questions}, время: {elapsed:.2f} с")
+    for path, count in sorted(upstream.items()):
+        print(f"  вызовов {path}: {count}")
+    for name, flight in stats.items():
+        print(f"  {name:>10}: вызовов {flight['calls']}, объединено {flight['coalesced']} "
+              f"({flight['coalesced_rate']:.0%})")
+    differing = sum(1 for replies in answers.values() if len(replies) > 1)
+    print(f"Вопросов с разными ответами пользователям: {differing}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Поддельные объекты Telegram для прогона handle_message без сети"""
+import itertools
+from types import SimpleNamespace
+
+_message_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, text, replies=None):
+        self.text = text
+        self.message_id = next(_message_ids)
+        # Ответы и их правки пишутся в общий список исходного сообщения
+        self.replies = [] if replies is None else replies
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return FakeMessage(text, self.replies)
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        self.replies.append(text)
+        return self
+
+
+class FakeUpdate:
+    def __init__(self, user_id, text):
+        self.effective_user = SimpleNamespace(id=user_id)
+        self.message = FakeMessage(text)
@@ -0,0 +1,211 @@
+"""Локальный сайт-заглушка abit.itmo.ru для проверки парсера без сети.
+
+Отдает страницы программ с __NEXT_DATA__ и PDF учебных планов, поддерживает
+условные запросы (ETag/If-None-Match, Last-Modified/If-Modified-Since) и
+считает ответы 200 и 304.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_pdf(pages):
+    """Минимальный PDF: pages - список страниц, страница - список строк.
+
+    Символы кодируются однобайтовыми кодами с картой ToUnicode, поэтому
+    PyPDF2 извлекает кириллицу без встраивания шрифта.
+    """
+    chars = sorted({char for page in pages for line in page for char in line})
+    if len(chars) > 255:
+        raise ValueError("Слишком много разных символов для однобайтовой кодировки")
+    codes = {char: index + 1 for index, char in enumerate(chars)}
+
+    mappings = [f"<{codes[char]:02X}> <{ord(char):04X}>" for char in chars]
+    cmap_lines = ['/CIDInit /ProcSet findresource begin', '12 dict begin', 'begincmap',
+                  '/CMapName /Fixture def', '1 begincodespacerange <00> <FF> endcodespacerange']
+    for start in range(0, len(mappings), 100):
+        block = mappings[start:start + 100]
+        cmap_lines += [f"{len(block)} beginbfchar", *block, 'endbfchar']
+    cmap_lines += ['endcmap', 'CMapName currentdict /CMap defineresource pop', 'end', 'end']
+    cmap = '\n'.join(cmap_lines).encode('ascii')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /ToUnicode 4 0 R >>',
+        b'<< /Length %d >>\nstream\n' % len(cmap) + cmap + b'\nendstream'
+    ]
+    page_ids = []
+    for page in pages:
+        commands = ['BT /F1 10 Tf 40 800 Td 12 TL']
+        for line in page:
+            commands.append(f"<{''.join(f'{codes[char]:02X}' for char in line)}> Tj T*")
+        commands.append('ET')
+        content = '\n'.join(commands).encode('ascii')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+        content_id = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode('ascii')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def _course_name(index):
+    """Уникальное буквенное имя дисциплины: цифры в названии не пропускает разбор строк плана"""
+    letters = ''
+    while True:
+        index, rest = divmod(index, 32)
+        letters = chr(ord('А') + rest) + letters
+        if not index:
+            return letters
+
+
+def curriculum_pages(courses=40, lines_per_page=40):
+    """Страницы учебного плана в формате, который разбирает DataParser"""
+    lines = ['Обязательные дисциплины']
+    lines += [f"{1 + i % 4}Дисциплина {_course_name(i)}   {3000 + i}" for i in range(courses // 2)]
+    lines.append('Пул выборных дисциплин')
+    lines += [f"{1 + i % 4}Выборная дисциплина {_course_name(i)}   {5000 + i}" for i in range(courses - courses // 2)]
+    lines.append('Государственная итоговая аттестация')
+    return [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+
+def program_page(program_key, pdf_url):
+    next_data = {'props': {'pageProps': {
+        'jsonProgram': {
+            'about': {'lead': f"Программа {program_key}", 'desc': f"Описание программы {program_key}"},
+            'career': {'lead': 'Карьерные перспективы выпускников'},
+            'faq': [{'question': 'Можно ли учиться онлайн?', 'answer': 'Да'}]
+        },
+        'apiProgram': {
+            'title': f"Магистерская программа {program_key}",
+            'academic_plan': pdf_url,
+            'educationCost': {'russian': 599000, 'foreigner': 599000, 'year': 2025},
+            'study': {'period': '2 года', 'mode': 'очная'}
+        }
+    }}}
+    return (
+        '<html><head><title>ИТМО</title></head><body>'
+        '<script id="__NEXT_DATA__" type="application/json">'
+        f"{json.dumps(next_data, ensure_ascii=False)}</script></body></html>"
+    ).encode('utf-8')
+
+
+class FixtureSite:
+    """HTTP-сервер со страницами /program/master/<key> и PDF /plans/<key>.pdf.
+
+    latency - задержка каждого ответа в секундах.
+    validators - отдавать ETag и Last-Modified и отвечать 304 на условные запросы.
+    """
+
+    def __init__(self, program_keys, latency=0.0, courses=40, validators=True):
+        self.latency = latency
+        self.validators = validators
+        self.responses = Counter()
+        self._lock = threading.Lock()
+        self._program_keys = list(program_keys)
+        self._courses = courses
+        self._resources = {}
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def programs(self):
+        """Словарь для DataParser(programs=...)"""
+        return {key: f"{self.url}/program/master/{key}" for key in self._program_keys}
+
+    def _publish(self, path, body, content_type):
+        self._resources[path] = {
+            'body': body,
+            'content_type': content_type,
+            'etag': '"%s"' % hashlib.sha1(body).hexdigest(),
+            'last_modified': formatdate(time.time(), usegmt=True)
+        }
+
+    def update_program(self, program_key, courses=None):
+        """Новая версия учебного плана программы (меняет ETag)"""
+        pages = curriculum_pages(courses or self._courses + 1)
+        self._publish(f"/plans/{program_key}.pdf", make_pdf(pages), 'application/pdf')
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(site.latency)
+                resource = site._resources.get(self.path)
+                if resource is None:
+                    self._send(404, b'not found', 'text/plain')
+                    return
+                headers = {}
+                if site.validators:
+                    headers = {'ETag': resource['etag'], 'Last-Modified': resource['last_modified']}
+                    if_none_match = self.headers.get('If-None-Match')
+                    if (if_none_match == resource['etag'] or if_none_match is None
+                            and self.headers.get('If-Modified-Since') == resource['last_modified']):
+                        self._send(304, b'', None, headers)
+                        return
+                self._send(200, resource['body'], resource['content_type'], headers)
+
+            def _send(self, status, body, content_type, headers=None):
+                with site._lock:
+                    site.responses[status] += 1
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        for key in self._program_keys:
+            self._publish(f"/plans/{key}.pdf", make_pdf(curriculum_pages(self._courses)), 'application/pdf')
+            self._publish(f"/program/master/{key}",
+                          program_page(key, f"{self.url}/plans/{key}.pdf"), 'text/html; charset=utf-8')
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
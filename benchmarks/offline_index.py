@@ -0,0 +1,40 @@
+"""Векторный индекс для бенчмарков без сети.
+
+create_database по закоммиченным data/programs_data.json (и data/curriculum_*.json,
+если есть) с эмбеддингами заглушки Mistral. Индекс пишется во временный каталог,
+поэтому data/index.vdb бота не затрагивается, а модель эмбеддингов документов
+и запросов совпадает.
+"""
+import contextlib
+import glob
+import io
+import json
+import os
+
+
+def load_sources():
+    """(данные программ, учебные планы по ключам программ) из data/"""
+    with open('data/programs_data.json', encoding='utf-8') as f:
+        programs_data = json.load(f)
+    curricula = {}
+    for path in glob.glob('data/curriculum_*.json'):
+        program_key = os.path.basename(path)[len('curriculum_'):-len('.json')]
+        with open(path, encoding='utf-8') as f:
+            curricula[program_key] = json.load(f)
+    return programs_data, curricula
+
+
+async def build_offline_index(stub, directory):
+    """Индекс directory/index.vdb с эмбеддингами stub; VECTOR_INDEX_PATH указывает на него для следующих VectorDB"""
+    from vector_db import VectorDB
+
+    os.environ['EMBEDDING_PROVIDER'] = 'mistral'
+    os.environ['MISTRAL_API_KEY'] = 'benchmark-key'
+    os.environ['MISTRAL_API_URL'] = stub.embeddings_url
+    os.environ['EMBEDDING_STORE_DB'] = os.path.join(directory, 'embedding_store.sqlite')
+    os.environ['VECTOR_INDEX_PATH'] = os.path.join(directory, 'index.vdb')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        vector_db = VectorDB()
+        await vector_db.create_database(*load_sources())
+    return vector_db
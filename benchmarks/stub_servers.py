@@ -0,0 +1,165 @@
+"""Локальные HTTP-заглушки Mistral и OpenRouter для бенчмарков"""
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from text_utils import estimate_tokens
+
+
+def parse_latency(spec, seed=0):
+    """Задержка из строки: "0.3" или "fixed:0.3", "uniform:0.1,0.5", "lognormal:0.3,0.5"
+    (медиана и sigma логарифма), "exp:0.3" (среднее). Возвращает число или функцию без аргументов."""
+    kind, _, params = spec.partition(':') if ':' in spec else ('fixed', '', spec)
+    values = [float(value) for value in params.split(',')]
+    if kind == 'fixed':
+        return values[0]
+    rng = random.Random(seed)
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        return lambda: values[0] * math.exp(rng.normalvariate(0.0, values[1]))
+    if kind == 'exp':
+        return lambda: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def fake_embedding(text, dim):
+    """Детерминированный вектор для текста"""
+    rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+    return rng.standard_normal(dim).astype(np.float32).tolist()
+
+
+class StubServer:
+    """HTTP-сервер с эндпоинтами /v1/embeddings и /api/v1/chat/completions.
+
+    latency - задержка ответа в секундах: число или функция без аргументов (см. parse_latency).
+    chat_latency - отдельная задержка chat/completions, по умолчанию как latency.
+    error_rate - доля ответов 429/503 для проверки повторов.
+    token_latency - пауза между фрагментами потокового (SSE) ответа.
+    prefill_latency - дополнительная задержка chat/completions на 1000 токенов промпта.
+    """
+
+    def __init__(self, latency=0.0, dim=1024, answer="Стоимость обучения указана на сайте программы.",
+                 error_rate=0.0, token_latency=0.0, prefill_latency=0.0, chat_latency=None):
+        self.latency = latency
+        self.chat_latency = latency if chat_latency is None else chat_latency
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.dim = dim
+        self.answer = answer
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def embeddings_url(self):
+        return f"{self.url}/v1/embeddings"
+
+    @property
+    def openrouter_url(self):
+        return f"{self.url}/api/v1"
+
+    def _delay(self, path):
+        latency = self.chat_latency if path.endswith('/chat/completions') else self.latency
+        return latency() if callable(latency) else latency
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, answer):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                self.wfile.write(b': OPENROUTER PROCESSING\n\n')
+                for token in answer.split(' '):
+                    chunk = {'choices': [{'delta': {'content': token + ' '}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(stub.token_latency)
+                self.wfile.write(b'data: [DONE]\n\n')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                with stub._lock:
+                    stub.requests[self.path] += 1
+                time.sleep(stub._delay(self.path))
+                if stub.prefill_latency and self.path.endswith('/chat/completions'):
+                    prompt = ''.join(message.get('content', '') for message in payload.get('messages', []))
+                    time.sleep(stub.prefill_latency * estimate_tokens(prompt) / 1000)
+
+                if stub.error_rate and random.random() < stub.error_rate:
+                    with stub._lock:
+                        stub.requests['errors'] += 1
+                    if random.random() < 0.5:
+                        self._send_json(429, {'error': 'rate limited'}, {'Retry-After': '0.1'})
+                    else:
+                        self._send_json(503, {'error': 'unavailable'})
+                    return
+
+                if self.path.endswith('/embeddings'):
+                    self._send_json(200, {'data': [
+                        {'index': i, 'embedding': fake_embedding(text, stub.dim)}
+                        for i, text in enumerate(payload.get('input', []))
+                    ]})
+                elif self.path.endswith('/chat/completions') and payload.get('stream'):
+                    self._send_stream(stub.answer)
+                elif self.path.endswith('/chat/completions'):
+                    self._send_json(200, {'choices': [
+                        {'message': {'role': 'assistant', 'content': stub.answer}}
+                    ]})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
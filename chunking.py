@@ -0,0 +1,87 @@
+import os
+
+from text_utils import estimate_tokens
+
+CATEGORY_NAMES = {
+    'obligatory_courses': 'Обязательные курсы',
+    'practices': 'Практические курсы',
+    'elective_courses': 'Выборные дисциплины',
+    'soft_skills': 'Курсы по софт-скилам',
+    'universal_preparation': 'Универсальные дисциплины',
+    'gia': 'Государственная аттестация'
+}
+
+CHUNK_MODES = ('course', 'semester', 'category')
+
+
+class CurriculumChunker:
+    """Разбиение учебного плана на документы для векторной базы.
+
+    mode: 'course' - документ на дисциплину, 'semester' - на семестр внутри
+    категории, 'category' - на категорию целиком (прежнее поведение).
+    Документ длиннее max_tokens делится на части; overlap - сколько последних
+    дисциплин части повторяется в начале следующей.
+    """
+
+    def __init__(self, mode='semester', max_tokens=200, overlap=0):
+        if mode not in CHUNK_MODES:
+            raise ValueError(f"Неизвестный режим разбиения учебного плана: {mode}")
+        self.mode = mode
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.getenv('CURRICULUM_CHUNK_MODE', 'semester'),
+            max_tokens=int(os.getenv('CURRICULUM_CHUNK_MAX_TOKENS', '200')),
+            overlap=int(os.getenv('CURRICULUM_CHUNK_OVERLAP', '0'))
+        )
+
+    def config(self):
+        """Параметры разбиения: хранятся в заголовке индекса, их смена требует пересборки"""
+        return {'mode': self.mode, 'max_tokens': self.max_tokens, 'overlap': self.overlap}
+
+    def chunk(self, program_title, category, courses):
+        """Список (текст, метаданные) для дисциплин одной категории"""
+        category_name = CATEGORY_NAMES.get(category, category)
+
+        if self.mode == 'course':
+            return [
+                (f"{program_title}. {category_name}, {course.get('semester')} семестр: {course.get('title', '')}",
+                 {'category': category, 'semester': course.get('semester')})
+                for course in courses
+            ]
+
+        if self.mode == 'category':
+            groups = [(None, courses)]
+        else:
+            by_semester = {}
+            for course in courses:
+                by_semester.setdefault(course.get('semester'), []).append(course)
+            groups = sorted(by_semester.items(), key=lambda item: (item[0] is None, item[0] or 0))
+
+        chunks = []
+        for semester, group in groups:
+            if semester is None:
+                prefix = f"{program_title}. {category_name}: "
+                titles = [f"{course.get('title', '')} ({course.get('semester', '')})" for course in group]
+            else:
+                prefix = f"{program_title}. {category_name}, {semester} семестр: "
+                titles = [course.get('title', '') for course in group]
+            for part in self._split(prefix, titles):
+                chunks.append((prefix + ', '.join(part), {'category': category, 'semester': semester}))
+        return chunks
+
+    def _split(self, prefix, titles):
+        """Последовательные части списка titles, каждая вместе с prefix не длиннее max_tokens"""
+        parts = []
+        current = []
+        for title in titles:
+            if current and estimate_tokens(prefix + ', '.join(current + [title])) > self.max_tokens:
+                parts.append(current)
+                current = current[len(current) - self.overlap:] if 0 < self.overlap < len(current) else []
+            current.append(title)
+        if current:
+            parts.append(current)
+        return parts
@@ -0,0 +1,119 @@
+import os
+import re
+
+from text_utils import estimate_tokens
+
+_WORD = re.compile(r'\w+')
+
+
+class ContextBuilder:
+    """Сборка контекста для промпта в пределах бюджета токенов.
+
+    Документы идут по убыванию score; документ, слова которого почти целиком
+    (не меньше dedup_threshold) уже есть в выбранном документе, пропускается.
+    Заголовок документа до первого ": " (программа, категория, семестр) и текст
+    после него сравниваются по отдельности: общий заголовок частей учебного
+    плана не делает дубликатами части с разными дисциплинами.
+    Документ, не влезающий в остаток бюджета, обрезается, если остается хотя бы
+    min_doc_tokens, иначе отбрасывается вместе со всеми менее релевантными.
+    """
+
+    def __init__(self, max_tokens=1500, min_doc_tokens=50, dedup_threshold=0.8):
+        self.max_tokens = max_tokens
+        self.min_doc_tokens = min_doc_tokens
+        self.dedup_threshold = dedup_threshold
+
+        self.requests = 0
+        self.tokens_total = 0
+        self.truncated = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_tokens=int(os.getenv('CONTEXT_MAX_TOKENS', '1500')),
+            min_doc_tokens=int(os.getenv('CONTEXT_MIN_DOC_TOKENS', '50')),
+            dedup_threshold=float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.8'))
+        )
+
+    @staticmethod
+    def format_document(doc):
+        return f"[{doc['metadata']['type']}] {doc['document']}"
+
+    @staticmethod
+    def _words(text):
+        """(слова заголовка, слова текста) документа"""
+        header, separator, body = text.lower().partition(': ')
+        if not separator:
+            header, body = '', header
+        return frozenset(_WORD.findall(header)), frozenset(_WORD.findall(body))
+
+    def _contained(self, words, other):
+        return not words or len(words & other) / len(words) >= self.dedup_threshold
+
+    def _is_duplicate(self, words, selected_words):
+        header, body = words
+        if not header and not body:
+            return True
+        return any(
+            self._contained(header, other_header) and self._contained(body, other_body)
+            for other_header, other_body in selected_words
+        )
+
+    @staticmethod
+    def _truncate(text, max_tokens):
+        """Обрезка по границе слова до max_tokens по оценке estimate_tokens"""
+        limit = max(0, (max_tokens - 1) * 3 - 1)
+        if len(text) <= limit:
+            return text
+        cut = text.rfind(' ', 0, limit)
+        return text[:cut if cut > 0 else limit].rstrip(' ,.;:') + '…'
+
+    def build(self, relevant_docs):
+        """(текст контекста, статистика запроса)"""
+        ordered = sorted(relevant_docs, key=lambda doc: doc.get('score', 0.0), reverse=True)
+        parts = []
+        selected_words = []
+        used_tokens = 0
+        stats = {'docs_in': len(ordered), 'docs_used': 0, 'duplicates': 0, 'truncated': 0, 'dropped': 0}
+
+        for position, doc in enumerate(ordered):
+            words = self._words(doc['document'])
+            if self._is_duplicate(words, selected_words):
+                stats['duplicates'] += 1
+                continue
+
+            part = self.format_document(doc)
+            # Части разделяются пустой строкой
+            tokens = estimate_tokens(part) + (1 if parts else 0)
+            remaining = self.max_tokens - used_tokens
+            if tokens > remaining:
+                if remaining < self.min_doc_tokens:
+                    stats['dropped'] += len(ordered) - position
+                    break
+                part = self._truncate(part, remaining - (1 if parts else 0))
+                tokens = estimate_tokens(part) + (1 if parts else 0)
+                stats['truncated'] += 1
+
+            parts.append(part)
+            selected_words.append(words)
+            used_tokens += tokens
+            stats['docs_used'] += 1
+
+        stats['tokens'] = used_tokens
+        self.requests += 1
+        self.tokens_total += used_tokens
+        self.truncated += stats['truncated']
+        self.dropped += stats['dropped']
+        self.duplicates += stats['duplicates']
+        return "\n\n".join(parts), stats
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'avg_tokens': self.tokens_total / self.requests if self.requests else 0.0,
+            'truncated': self.truncated,
+            'dropped': self.dropped,
+            'duplicates': self.duplicates
+        }
@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import hashlib
 from bs4 import BeautifulSoup
 import json
 import os
@@ -6,43 +7,195 @@ import re
 import PyPDF2
 import io
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from http_cache import HTTPCache
+from http_client import get_http_client
+from metrics import get_metrics
+
+
+CURRICULUM_CATEGORIES = {
+    "obligatory_courses": ["Обязательные дисциплины"],
+    "elective_courses": ["Пул выборных дисциплин"],
+    "soft_skills": [
+        "Микромодули Soft Skills", "Элективные микромодули Soft Skills",
+        "Мировоззренческий модуль", "Предпринимательская культура", "Мышление",
+        "Этика", "Критическое мышление", "Навыки критического мышления"
+    ],
+    "universal_preparation": ["Универсальная (надпрофессиональная) подготовка"],
+    "practices": ["Блок 2. Практика", "Производственная практика", "практика", "Преддипломная практика"],
+    "gia": ["Государственная итоговая аттестация", "ГИА"],
+}
+
+# Строка-заголовок переключает категорию; при нескольких совпадениях побеждает первая категория в словаре
+_CATEGORY_MATCHERS = [
+    (key, re.compile('|'.join(re.escape(kw.lower()) for kw in keywords)))
+    for key, keywords in CURRICULUM_CATEGORIES.items()
+]
+_ANY_CATEGORY = re.compile('|'.join(
+    re.escape(kw.lower()) for keywords in CURRICULUM_CATEGORIES.values() for kw in keywords
+))
+_COURSE_LINE = re.compile(r"^(\d)([А-Яа-яA-Za-z /().-]+)\s+\d{4,}$")
+
+
+def _parser_version():
+    """Хэш исходного кода модуля: любая правка разбора делает недействительными его результаты в HTTP-кэше"""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+PARSER_VERSION = _parser_version()
+
+
+def iter_pdf_lines(pdf_reader):
+    """Непустые строки PDF постранично: в памяти одновременно текст только одной страницы"""
+    for page in pdf_reader.pages:
+        for line in page.extract_text().split('\n'):
+            stripped = line.strip()
+            if stripped:
+                yield stripped
+
+
+def iter_curriculum_courses(lines):
+    """Поток (категория, дисциплина) по строкам учебного плана"""
+    current_category = None
+    for line in lines:
+        lowered = line.lower()
+        if _ANY_CATEGORY.search(lowered):
+            current_category = next(key for key, matcher in _CATEGORY_MATCHERS if matcher.search(lowered))
+        if current_category:
+            match = _COURSE_LINE.match(line)
+            if match:
+                yield current_category, {"semester": int(match.group(1)), "title": match.group(2).strip()}
+
+
+def _dump_lines(lines, path):
+    """Копия потока строк в отладочный файл"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+            yield line
+
+
+def extract_curriculum(content, program_key, debug_dir=None):
+    """Разбор PDF учебного плана в словарь категория -> список дисциплин.
+
+    Функция уровня модуля: выполняется в дочернем процессе ProcessPoolExecutor,
+    так как извлечение текста PyPDF2 занимает процессор и блокировало бы event loop.
+    Если задан debug_dir, извлеченный текст пишется в curric_{program_key}.txt.
+    """
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    lines = iter_pdf_lines(pdf_reader)
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
+        lines = _dump_lines(lines, os.path.join(debug_dir, f'curric_{program_key}.txt'))
+
+    curriculum = defaultdict(list)
+    for category, course in iter_curriculum_courses(lines):
+        curriculum[category].append(course)
+
+    print(f"PDF разобран: {len(pdf_reader.pages)} страниц, "
+          f"{sum(len(courses) for courses in curriculum.values())} дисциплин")
+    return dict(curriculum)
+
 
 class DataParser:
-    def __init__(self):
-        self.programs = {
+    def __init__(self, programs=None):
+        self.programs = programs or {
             'ai': 'https://abit.itmo.ru/program/master/ai',
             'ai_product': 'https://abit.itmo.ru/program/master/ai_product'
         }
+        self.http = get_http_client()
+        self.http.configure_host(
+            'https://abit.itmo.ru',
+            concurrency=int(os.getenv('ITMO_MAX_CONCURRENCY', '4')),
+            timeout=float(os.getenv('ITMO_TIMEOUT', '30'))
+        )
+        # Страницы и PDF всех программ качаются параллельно, но не больше SCRAPER_CONCURRENCY сразу
+        self.fetch_limit = asyncio.Semaphore(int(os.getenv('SCRAPER_CONCURRENCY', '8')))
+        self.cache = HTTPCache.from_env()
+        if self.cache:
+            get_metrics().register('http_cache', self.cache.stats)
+        self.pdf_workers = int(os.getenv('PDF_WORKERS', '0')) or None
+        self.pdf_executor = None
+        self.debug_dir = os.getenv('CURRICULUM_DEBUG_DIR', '')
     
     async def parse_programs(self):
         """Парсинг данных с сайтов программ"""
         programs_data = {}
-        
-        for program_key, url in self.programs.items():
+        curricula = {}
+
+        # Каждый PDF разбирается отдельной задачей в пуле процессов
+        with ProcessPoolExecutor(max_workers=self.pdf_workers) as executor:
+            self.pdf_executor = executor
             try:
-                print(f"Парсинг программы: {program_key}")
-                data = await self._parse_program_page(url, program_key)
+                results = await asyncio.gather(
+                    *(self._parse_program(key, url) for key, url in self.programs.items())
+                )
+            finally:
+                self.pdf_executor = None
+
+        for program_key, (data, curriculum) in zip(self.programs, results):
+            if data is not None:
                 programs_data[program_key] = data
-                print(f"Программа {program_key} успешно спарсена")
-                pdf_url = programs_data[program_key]['curriculum_info']['link']
-                cur_data =  await self.parse_curriculum_2(pdf_url, program_key)
-            except Exception as e:
-                print(f"Ошибка парсинга {program_key}: {e}")
+            if curriculum is not None:
+                curricula[program_key] = curriculum
+
+        if self.cache:
+            print(f"HTTP-кэш: {self.cache.stats()}")
 
         os.makedirs('data', exist_ok=True)
         with open('data/programs_data.json', 'w', encoding='utf-8') as f:
             json.dump(programs_data, f, ensure_ascii=False, indent=2)
  
         
-        return programs_data, cur_data
+        return programs_data, curricula
+
+    async def _parse_program(self, program_key, url):
+        """Страница программы и ее учебный план: (данные, учебный план)"""
+        data = None
+        try:
+            print(f"Парсинг программы: {program_key}")
+            data = await self._parse_program_page(url, program_key)
+            print(f"Программа {program_key} успешно спарсена")
+            pdf_url = data['curriculum_info']['link']
+            return data, await self.parse_curriculum_2(pdf_url, program_key)
+        except Exception as e:
+            print(f"Ошибка парсинга {program_key}: {e}")
+        return data, None
+
+    async def _fetch(self, url):
+        """GET через HTTP-кэш (если включен) с общим лимитом параллельных загрузок"""
+        async with self.fetch_limit:
+            if self.cache:
+                return await self.cache.fetch(self.http, url)
+            response = await self.http.get(url)
+            response.raise_for_status()
+            return response
+
+    async def _parse_cached(self, response, name, parse):
+        """Результат await parse(response.content); для неизменившегося тела и той же версии парсера
+        берется из HTTP-кэша"""
+        if self.cache:
+            cached = self.cache.get_derived(response.url, name, PARSER_VERSION)
+            if cached is not None:
+                return cached
+        result = await parse(response.content)
+        if self.cache and result is not None:
+            self.cache.set_derived(response.url, name, result, PARSER_VERSION)
+        return result
     
     async def _parse_program_page(self, url, program_key):
         """Парсинг одной страницы программы"""
 
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        response = await self._fetch(url)
+        if getattr(response, 'not_modified', False):
+            print(f"  → {program_key}: страница не изменилась (304)")
+        return await self._parse_cached(
+            response, 'program', lambda content: asyncio.to_thread(self._parse_program_html, content, url)
+        )
+
+    def _parse_program_html(self, content, url):
+        soup = BeautifulSoup(content, 'html.parser')
         next_data = self._extract_next_data(soup)
         
         if next_data:
@@ -206,61 +359,31 @@ class DataParser:
         }
         
     async def parse_curriculum_2(self, pdf_url, program_key):
+        curriculum = {}
         try:
             print(f"Загружаем учебный план: {program_key}")
-            response = requests.get(pdf_url, timeout=30)
-            response.raise_for_status()
-            pdf_content = io.BytesIO(response.content)
-            pdf_reader = PyPDF2.PdfReader(pdf_content)
-            
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-
-            with open(f'curric_{program_key}.txt', 'w', encoding='utf-8') as f:
-                f.write(text)
-            
-            print(text[:100])
-            print(f"PDF загружен, {len(pdf_reader.pages)} страниц")
-        
-        
-            categories = {
-                "obligatory_courses": ["Обязательные дисциплины"],
-                "elective_courses": ["Пул выборных дисциплин"],
-                "soft_skills": [
-                    "Микромодули Soft Skills", "Элективные микромодули Soft Skills",
-                    "Мировоззренческий модуль", "Предпринимательская культура", "Мышление",
-                    "Этика", "Критическое мышление", "Навыки критического мышления"
-                ],
-                "universal_preparation": ["Универсальная (надпрофессиональная) подготовка"],
-                "practices": ["Блок 2. Практика", "Производственная практика", "практика", "Преддипломная практика"],
-                "gia": ["Государственная итоговая аттестация", "ГИА"],
-            }
-            curriculum = defaultdict(list)
-            current_category = None
-            course_line_pattern = re.compile(r"^(\d)([А-Яа-яA-Za-z /().-]+)\s+\d{4,}$")
-            for line in text.split('\n'):
-                stripped = line.strip()
-
-                if not stripped:
-                    continue
-                for key, keywords in categories.items():
-                    if any(kw.lower() in stripped.lower() for kw in keywords):
-                        current_category = key
-                        break
-                match = course_line_pattern.match(stripped)
-                if current_category and match:
-                    semester = int(match.group(1))
-                    title = match.group(2).strip()
-                    curriculum[current_category].append({"semester": semester, "title": title})
-            curriculum = dict(curriculum)
+            response = await self._fetch(pdf_url)
+            if getattr(response, 'not_modified', False):
+                print(f"  → {program_key}: учебный план не изменился (304)")
+            curriculum = await self._parse_cached(response, 'curriculum', self._run_pdf_task(program_key))
             await self._save_curriculum_data(curriculum, program_key)
 
         except Exception as e:
                 print(f"Ошибка парсинга: {e}")
         
         return curriculum
-    
+
+    def _run_pdf_task(self, program_key):
+        """Функция разбора PDF: в пуле процессов parse_programs или, вне его, в отдельном потоке"""
+        async def parse(content):
+            if self.pdf_executor is None:
+                return await asyncio.to_thread(extract_curriculum, content, program_key, self.debug_dir)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.pdf_executor, extract_curriculum, content, program_key, self.debug_dir
+            )
+        return parse
+
     async def _save_curriculum_data(self, curriculum, program_key):
         """Сохранение данных учебного плана"""
         os.makedirs('data', exist_ok=True)
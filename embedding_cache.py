@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """Кэш эмбеддингов запросов: LRU с TTL в памяти и опциональный уровень в SQLite.
+
+    SQLite не трогается из event loop: чтение с диска идет через asyncio.to_thread,
+    а новые эмбеддинги и отметки last_used копятся в памяти и пишутся пакетом
+    раз в flush_interval секунд или по накоплении flush_batch записей.
+    """
+
+    def __init__(self, max_size=1000, ttl=7 * 24 * 3600, db_path=None, max_disk_size=50000,
+                 flush_interval=5.0, flush_batch=100, prune_every=100):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_disk_size = max_disk_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.prune_every = prune_every
+        self._memory = OrderedDict()
+        self._db = None
+        # Запросы выполняются из пула потоков asyncio.to_thread, доступ сериализуется блокировкой
+        self._db_lock = threading.Lock()
+
+        # Отложенная запись: ключ -> (вектор, created_at) и ключ -> last_used
+        self._pending_puts = {}
+        self._pending_touches = {}
+        self._unpruned = 0
+        self._flush_task = None
+        self._flush_tasks = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.embed_calls = 0
+        self.embed_time = 0.0
+        self.flushed = 0
+
+        if db_path:
+            self._open_db(db_path)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv('QUERY_CACHE_SIZE', '1000')),
+            ttl=float(os.getenv('QUERY_CACHE_TTL', str(7 * 24 * 3600))),
+            db_path=os.getenv('QUERY_CACHE_DB', 'data/query_cache.sqlite'),
+            max_disk_size=int(os.getenv('QUERY_CACHE_DISK_SIZE', '50000')),
+            flush_interval=float(os.getenv('QUERY_CACHE_FLUSH_INTERVAL', '5'))
+        )
+
+    def _open_db(self, db_path):
+        try:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS query_embeddings ('
+                'key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Дисковый кэш эмбеддингов недоступен ({db_path}): {e}")
+            self._db = None
+
+    @staticmethod
+    def normalize(query):
+        """Нормализация текста запроса для ключа кэша"""
+        text = query.lower().replace('ё', 'е')
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text.rstrip('?!.… ')
+
+    def _key(self, query, model):
+        return f"{model}\0{self.normalize(query)}"
+
+    def _get_memory(self, key, now):
+        entry = self._memory.get(key)
+        if entry is None:
+            # Вытеснен из памяти, но еще не записан на диск
+            entry = self._pending_puts.get(key)
+            if entry is None:
+                return None
+        vector, created_at = entry
+        if now - created_at > self.ttl:
+            self._memory.pop(key, None)
+            return None
+        if key in self._memory:
+            self._memory.move_to_end(key)
+        return vector
+
+    def get(self, query, model):
+        """Эмбеддинг запроса из памяти или None, без обращения к диску и без учета в метриках"""
+        return self._get_memory(self._key(query, model), time.time())
+
+    async def get_many(self, queries, model):
+        """Эмбеддинги запросов (None для промахов): из памяти, остальные одним чтением SQLite в потоке"""
+        now = time.time()
+        keys = [self._key(query, model) for query in queries]
+        vectors = [self._get_memory(key, now) for key in keys]
+        self.memory_hits += sum(vector is not None for vector in vectors)
+
+        missing = {key for key, vector in zip(keys, vectors) if vector is None}
+        if missing and self._db is not None:
+            rows = await asyncio.to_thread(self._read, sorted(missing))
+            for i, key in enumerate(keys):
+                row = rows.get(key)
+                if vectors[i] is None and row is not None and now - row[1] <= self.ttl:
+                    vectors[i] = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vectors[i], row[1])
+                    self._pending_touches[key] = now
+                    self.disk_hits += 1
+            if len(self._pending_touches) >= self.flush_batch:
+                self._request_flush()
+
+        self.misses += sum(vector is None for vector in vectors)
+        return vectors
+
+    def _read(self, keys):
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT key, vector, created_at FROM query_embeddings WHERE key IN ({','.join('?' * len(keys))})",
+                keys
+            ).fetchall()
+        return {key: (vector, created_at) for key, vector, created_at in rows}
+
+    def put(self, query, model, vector, latency=None):
+        """Сохранение эмбеддинга; latency - время запроса к API, идет в оценку сэкономленного времени"""
+        key = self._key(query, model)
+        vector = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        if latency is not None:
+            self.embed_calls += 1
+            self.embed_time += latency
+
+        self._remember(key, vector, now)
+
+        if self._db is not None:
+            self._pending_puts[key] = (vector, now)
+            self._pending_touches.pop(key, None)
+            if len(self._pending_puts) >= self.flush_batch:
+                self._request_flush()
+
+    def _remember(self, key, vector, created_at):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _request_flush(self):
+        if self._flush_task is not None:
+            self._flush_requested.set()
+            return
+        # Без запущенного цикла записи (start() не вызван) пишем разовой задачей
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """Запись накопленных эмбеддингов и отметок last_used одним пакетом"""
+        async with self._flush_lock:
+            puts, self._pending_puts = self._pending_puts, {}
+            touches, self._pending_touches = self._pending_touches, {}
+            if self._db is None or not (puts or touches):
+                return
+            prune = self._unpruned + len(puts) >= self.prune_every
+            try:
+                await asyncio.to_thread(self._write, puts, touches, prune)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи кэша эмбеддингов: {e}")
+                for key, entry in puts.items():
+                    self._pending_puts.setdefault(key, entry)
+                for key, last_used in touches.items():
+                    self._pending_touches.setdefault(key, last_used)
+                return
+            self._unpruned = 0 if prune else self._unpruned + len(puts)
+            self.flushed += len(puts) + len(touches)
+
+    def _write(self, puts, touches, prune):
+        now = time.time()
+        with self._db_lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO query_embeddings (key, vector, created_at, last_used) VALUES (?, ?, ?, ?)',
+                [(key, vector.tobytes(), created_at, created_at) for key, (vector, created_at) in puts.items()]
+            )
+            self._db.executemany(
+                'UPDATE query_embeddings SET last_used = MAX(last_used, ?) WHERE key = ?',
+                [(last_used, key) for key, last_used in touches.items()]
+            )
+            if prune:
+                self._prune_db(now)
+            self._db.commit()
+
+    def _prune_db(self, now):
+        self._db.execute('DELETE FROM query_embeddings WHERE created_at < ?', (now - self.ttl,))
+        self._db.execute(
+            'DELETE FROM query_embeddings WHERE key NOT IN '
+            '(SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT ?)',
+            (self.max_disk_size,)
+        )
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def start(self):
+        if self._flush_task is None and self._db is not None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def stats(self):
+        """Метрики кэша: попадания, промахи и сэкономленное время"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        avg_latency = self.embed_time / self.embed_calls if self.embed_calls else 0.0
+        return {
+            'size': len(self._memory),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'avg_embed_latency_s': avg_latency,
+            'saved_latency_s': hits * avg_latency,
+            'pending_writes': len(self._pending_puts) + len(self._pending_touches),
+            'flushed': self.flushed
+        }
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+class EmbeddingStore:
+    """Хранилище эмбеддингов документов с адресацией по хэшу текста и имени модели"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS document_embeddings ('
+            'key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('EMBEDDING_STORE_DB', 'data/embedding_store.sqlite'))
+
+    @staticmethod
+    def content_key(text, model):
+        return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts, model):
+        """Словарь {индекс текста: вектор} для уже посчитанных эмбеддингов"""
+        keys = [self.content_key(text, model) for text in texts]
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM document_embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+    def put_many(self, texts, model, vectors):
+        now = time.time()
+        self._db.executemany(
+            'INSERT OR REPLACE INTO document_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)',
+            [(self.content_key(text, model), model, np.asarray(vector, dtype=np.float32).tobytes(), now)
+             for text, vector in zip(texts, vectors)]
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
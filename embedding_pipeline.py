@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from http_client import APIError
+from text_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingPipeline:
+    """Параллельное получение эмбеддингов батчами с учетом лимита токенов и повторами при 429/5xx"""
+
+    def __init__(self, embed_batch, max_batch_tokens=16000, max_batch_size=64, concurrency=4,
+                 max_retries=5, backoff_base=1.0, backoff_max=30.0):
+        self.embed_batch = embed_batch
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_env(cls, embed_batch):
+        return cls(
+            embed_batch,
+            max_batch_tokens=int(os.getenv('EMBED_MAX_BATCH_TOKENS', '16000')),
+            max_batch_size=int(os.getenv('EMBED_MAX_BATCH_SIZE', '64')),
+            concurrency=int(os.getenv('EMBED_CONCURRENCY', '4')),
+            max_retries=int(os.getenv('EMBED_MAX_RETRIES', '5')),
+            backoff_base=float(os.getenv('EMBED_BACKOFF_BASE', '1.0')),
+            backoff_max=float(os.getenv('EMBED_BACKOFF_MAX', '30'))
+        )
+
+    def make_batches(self, texts):
+        """Разбиение индексов текстов на батчи не больше max_batch_tokens и max_batch_size"""
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, APIError):
+            return error.status_code == 429 or (error.status_code or 0) >= 500
+        return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+    def _backoff(self, attempt, error):
+        if isinstance(error, APIError) and error.retry_after is not None:
+            return min(error.retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _embed_with_retry(self, batch_texts, stats):
+        attempt = 0
+        while True:
+            try:
+                vectors = await self.embed_batch(batch_texts)
+                if len(vectors) != len(batch_texts):
+                    raise ValueError(f"API вернул {len(vectors)} эмбеддингов на {len(batch_texts)} текстов")
+                return vectors
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                stats['retries'] += 1
+                logger.warning(f"Повтор батча эмбеддингов через {delay:.1f} с: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _run_batch(self, batch, texts, semaphore, vectors, failures, stats):
+        async with semaphore:
+            try:
+                batch_vectors = await self._embed_with_retry([texts[i] for i in batch], stats)
+            except Exception as e:
+                if len(batch) > 1 and not self._is_retryable(e):
+                    # Ошибка запроса (например, слишком длинный текст): делим батч, чтобы найти виновника
+                    middle = len(batch) // 2
+                    halves = (batch[:middle], batch[middle:])
+                else:
+                    for i in batch:
+                        failures[i] = str(e)
+                    return
+            else:
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                return
+        await asyncio.gather(*(self._run_batch(half, texts, semaphore, vectors, failures, stats) for half in halves))
+
+    async def run(self, texts):
+        """Эмбеддинги для texts: ({индекс: вектор}, {индекс: ошибка}, статистика)"""
+        started = time.perf_counter()
+        batches = self.make_batches(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        vectors, failures = {}, {}
+        stats = {'documents': len(texts), 'batches': len(batches), 'retries': 0}
+
+        await asyncio.gather(*(
+            self._run_batch(batch, texts, semaphore, vectors, failures, stats) for batch in batches
+        ))
+
+        elapsed = time.perf_counter() - started
+        stats.update({
+            'embedded': len(vectors),
+            'failed': len(failures),
+            'elapsed_s': elapsed,
+            'docs_per_sec': len(vectors) / elapsed if elapsed > 0 else 0.0
+        })
+        return vectors, failures, stats
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from http_client import APIError, get_http_client
+
+_WORD = re.compile(r'\w+')
+
+
+class EmbeddingProvider:
+    """Источник эмбеддингов для VectorDB.
+
+    name - идентификатор модели и версии векторов: сохраняется в заголовке
+    индекса и в ключах кэшей, при его смене база пересобирается.
+    remote - эмбеддинги считаются на внешнем сервисе (имеет смысл кэшировать).
+    """
+
+    name = None
+    remote = False
+
+    async def embed(self, texts):
+        """Список векторов для texts в том же порядке"""
+        raise NotImplementedError
+
+
+class MistralEmbeddingProvider(EmbeddingProvider):
+    """Эмбеддинги Mistral API"""
+
+    remote = True
+
+    def __init__(self, api_key, url='https://api.mistral.ai/v1/embeddings', model='mistral-embed'):
+        self.api_key = api_key
+        self.url = url
+        self.name = model
+        self.http = get_http_client()
+        self.http.configure_host(
+            self.url,
+            concurrency=int(os.getenv('MISTRAL_MAX_CONCURRENCY', '8')),
+            timeout=float(os.getenv('MISTRAL_TIMEOUT', '30'))
+        )
+
+    async def embed(self, texts):
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        data = {
+            'model': self.name,
+            'input': texts
+        }
+
+        response = await self.http.post(
+            self.url,
+            headers=headers,
+            json=data
+        )
+
+        if response.status_code == 200:
+            result = response.json()
+            return [item['embedding'] for item in result['data']]
+        else:
+            raise APIError.from_response("Ошибка получения эмбеддингов", response)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Локальные эмбеддинги без сети: символьные n-граммы слов, хэшированные в dim измерений.
+
+    Вес n-граммы - сублинейная частота 1 + log(tf) со знаком из хэша (снижает
+    вклад коллизий), вектор нормируется. Результат детерминирован: crc32 не
+    зависит от PYTHONHASHSEED, поэтому векторы совпадают между запусками и
+    процессами. Любое изменение алгоритма должно увеличивать VERSION.
+    """
+
+    VERSION = 1
+
+    def __init__(self, dim=1024, min_n=2, max_n=4):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.name = f"local-hash-char{min_n}-{max_n}-d{dim}-v{self.VERSION}"
+
+    def encode(self, texts):
+        """Матрица эмбеддингов len(texts) x dim"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = Counter()
+            for word in _WORD.findall(text.lower().replace('ё', 'е')):
+                padded = f" {word} "
+                for n in range(self.min_n, self.max_n + 1):
+                    grams.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+            if not grams:
+                continue
+            hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32, count=len(grams))
+            weights = 1.0 + np.log(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], (hashes % self.dim).astype(np.int64), signs * weights)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    async def embed(self, texts):
+        if len(texts) <= 8:
+            return self.encode(texts)
+        return await asyncio.to_thread(self.encode, texts)
+
+
+def make_embedding_provider(name=None):
+    """Провайдер эмбеддингов из EMBEDDING_PROVIDER: mistral или local (по умолчанию mistral при наличии ключа)"""
+    api_key = os.getenv('MISTRAL_API_KEY')
+    name = name or os.getenv('EMBEDDING_PROVIDER') or ('mistral' if api_key else 'local')
+    if name == 'mistral':
+        if not api_key:
+            raise ValueError("Для EMBEDDING_PROVIDER=mistral нужен MISTRAL_API_KEY")
+        return MistralEmbeddingProvider(api_key, os.getenv('MISTRAL_API_URL', 'https://api.mistral.ai/v1/embeddings'))
+    if name == 'local':
+        return HashingEmbeddingProvider(dim=int(os.getenv('LOCAL_EMBEDDING_DIM', '1024')))
+    raise ValueError(f"Неизвестный провайдер эмбеддингов: {name}")
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Ответ, прошедший через HTTPCache"""
+
+    __slots__ = ('url', 'status_code', 'content', 'not_modified')
+
+    def __init__(self, url, status_code, content, not_modified=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        # Тело взято с диска после 304 Not Modified
+        self.not_modified = not_modified
+
+
+class HTTPCache:
+    """Дисковый HTTP-кэш для парсера: условные запросы по ETag/Last-Modified.
+
+    На каждый URL хранятся тело ответа и JSON с валидаторами, хэшем тела и
+    результатами разбора (derived). Результаты разбора действительны, пока
+    не меняются хэш тела и версия разбора, поэтому после 304 страницу не нужно
+    разбирать заново.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.not_modified = 0
+        self.downloaded = 0
+        self.bytes_downloaded = 0
+
+    @classmethod
+    def from_env(cls):
+        """Кэш из HTTP_CACHE_DIR или None, если переменная задана пустой"""
+        cache_dir = os.getenv('HTTP_CACHE_DIR', 'data/http_cache')
+        return cls(cache_dir) if cache_dir else None
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.json", f"{base}.body"
+
+    def _load_meta(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return meta if meta.get('url') == url and os.path.exists(body_path) else None
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, url, meta, content=None):
+        meta_path, body_path = self._paths(url)
+        if content is not None:
+            self._write_atomic(body_path, content)
+        self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def _read_body(self, url):
+        with open(self._paths(url)[1], 'rb') as f:
+            return f.read()
+
+    async def fetch(self, http, url):
+        """GET через http (HTTPClient) с условными заголовками; 304 отдает тело с диска"""
+        meta = await asyncio.to_thread(self._load_meta, url)
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = await http.get(url, headers=headers)
+        if response.status_code == 304 and meta:
+            self.not_modified += 1
+            content = await asyncio.to_thread(self._read_body, url)
+            return CachedResponse(url, 304, content, not_modified=True)
+        response.raise_for_status()
+
+        content = response.content
+        self.downloaded += 1
+        self.bytes_downloaded += len(content)
+        digest = hashlib.sha256(content).hexdigest()
+        new_meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest,
+            'stored_at': time.time(),
+            # Тело не изменилось (сервер без валидаторов) - прежний разбор остается в силе
+            'derived': meta['derived'] if meta and meta.get('digest') == digest else {}
+        }
+        try:
+            await asyncio.to_thread(self._store, url, new_meta, content)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить {url} в HTTP-кэш: {e}")
+        return CachedResponse(url, response.status_code, content)
+
+    def get_derived(self, url, name, version):
+        """Сохраненный результат разбора тела url той же версии разбора или None"""
+        meta = self._load_meta(url)
+        derived = meta['derived'].get(name) if meta else None
+        if not isinstance(derived, dict) or derived.get('version') != version:
+            return None
+        return derived.get('value')
+
+    def set_derived(self, url, name, value, version):
+        meta = self._load_meta(url)
+        if meta is None:
+            return
+        meta['derived'][name] = {'version': version, 'value': value}
+        try:
+            self._store(url, meta)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить разбор {url} в HTTP-кэш: {e}")
+
+    def stats(self):
+        return {
+            'not_modified': self.not_modified,
+            'downloaded': self.downloaded,
+            'bytes_downloaded': self.bytes_downloaded
+        }
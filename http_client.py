@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class APIError(Exception):
+    """Ошибка ответа внешнего API"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, prefix, response):
+        retry_after = response.headers.get('Retry-After')
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        return cls(f"{prefix}: {response.status_code} - {response.text}",
+                   status_code=response.status_code, retry_after=retry_after)
+
+
+class HTTPClient:
+    """Общий асинхронный HTTP-клиент: пул keep-alive соединений и лимит параллельных запросов на хост"""
+
+    def __init__(self):
+        self.timeout = float(os.getenv('HTTP_TIMEOUT', '30'))
+        self.connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+        self.max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '20'))
+        self.max_keepalive = int(os.getenv('HTTP_MAX_KEEPALIVE_PER_HOST', '10'))
+        self.default_concurrency = int(os.getenv('HTTP_MAX_CONCURRENCY_PER_HOST', '16'))
+        self._hosts = {}
+        self._clients = {}
+        self._semaphores = {}
+        self.metrics = get_metrics()
+
+    @staticmethod
+    def _host_key(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def configure_host(self, url, concurrency=None, timeout=None):
+        """Настройка лимита параллельных запросов и таймаута для хоста из url"""
+        host = self._host_key(url)
+        self._hosts[host] = {
+            'concurrency': concurrency or self.default_concurrency,
+            'timeout': timeout or self.timeout
+        }
+        self._semaphores.pop(host, None)
+
+    def _get_client(self, host):
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            settings = self._hosts.get(host, {})
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.get('timeout', self.timeout), connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive),
+                follow_redirects=True
+            )
+            self._clients[host] = client
+        return client
+
+    def _get_semaphore(self, host):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            concurrency = self._hosts.get(host, {}).get('concurrency', self.default_concurrency)
+            semaphore = asyncio.Semaphore(concurrency)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    def _record(self, host, started, status):
+        """Длительность и исход запроса к хосту: код ответа или 'error' при сетевой ошибке"""
+        self.metrics.observe('upstream_seconds', time.perf_counter() - started, host=host)
+        self.metrics.inc('upstream_requests_total', host=host, status=status)
+
+    async def request(self, method, url, **kwargs):
+        host = self._host_key(url)
+        async with self._get_semaphore(host):
+            started = time.perf_counter()
+            try:
+                response = await self._get_client(host).request(method, url, **kwargs)
+            except httpx.HTTPError:
+                self._record(host, started, 'error')
+                raise
+            self._record(host, started, response.status_code)
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Потоковый запрос: слот хоста занят, пока читается тело ответа"""
+        host = self._host_key(url)
+        async with self._get_semaphore(host):
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                async with self._get_client(host).stream(method, url, **kwargs) as response:
+                    status = response.status_code
+                    yield response
+            finally:
+                self._record(host, started, status)
+
+    async def aclose(self):
+        """Закрытие всех пулов соединений"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+        self._semaphores = {}
+
+
+_shared_client = None
+
+
+def get_http_client():
+    """Общий HTTP-клиент процесса"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HTTPClient()
+    return _shared_client
+
+
+async def close_http_client():
+    if _shared_client is not None:
+        await _shared_client.aclose()
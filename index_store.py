@@ -0,0 +1,181 @@
+import json
+import os
+import struct
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+# Формат файла индекса (все числа little-endian):
+#   [0, 4096)   заголовок: magic, версия, длина JSON, JSON с размерами и смещениями блоков
+#   [4096, ...) эмбеддинги float32 (count x dim), затем таблицы смещений uint64 (count + 1)
+#               для текстов и метаданных и сами тексты (utf-8) и метаданные (компактный JSON),
+#               затем (с версии 2) именованные массивы производных индексов, выровненные по 8 байт
+INDEX_MAGIC = b'ITMOVDB\0'
+INDEX_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HEADER_SIZE = 4096
+_PREFIX = struct.Struct('<8sII')
+
+
+class IndexFormatError(Exception):
+    """Файл индекса поврежден или записан несовместимой версией"""
+
+
+class _BlobSequence(Sequence):
+    """Ленивый список записей поверх отображенного в память блока"""
+
+    def __init__(self, raw, offsets, base, decode):
+        self._raw = raw
+        self._offsets = offsets
+        self._base = base
+        self._decode = decode
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start = self._base + int(self._offsets[index])
+        end = self._base + int(self._offsets[index + 1])
+        return self._decode(self._raw[start:end].tobytes())
+
+
+def _encode_blob(items, encode):
+    encoded = [encode(item) for item in items]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def _align(value, alignment=8):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def write_index(path, embeddings, documents, metadata, meta=None, arrays=None):
+    """Атомарная запись индекса: временный файл, fsync и os.replace.
+
+    arrays - словарь имя -> numpy-массив (BM25, индексы метаданных), открываемый вместе с индексом.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='<f4')
+    if embeddings.ndim != 2 or len(embeddings) != len(documents) or len(documents) != len(metadata):
+        raise ValueError("Размеры эмбеддингов, документов и метаданных не совпадают")
+
+    doc_offsets, doc_blob = _encode_blob(documents, lambda text: text.encode('utf-8'))
+    meta_offsets, meta_blob = _encode_blob(
+        metadata, lambda item: json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    )
+
+    embeddings_offset = HEADER_SIZE
+    doc_offsets_offset = _align(embeddings_offset + embeddings.nbytes)
+    meta_offsets_offset = doc_offsets_offset + doc_offsets.nbytes
+    documents_offset = meta_offsets_offset + meta_offsets.nbytes
+    metadata_offset = documents_offset + len(doc_blob)
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()}
+    array_layout = {}
+    end = metadata_offset + len(meta_blob)
+    for name, array in arrays.items():
+        offset = _align(end)
+        array_layout[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        end = offset + array.nbytes
+
+    header = json.dumps({
+        'count': len(documents),
+        'dim': int(embeddings.shape[1]),
+        'dtype': 'float32',
+        'normalized': True,
+        'embeddings_offset': embeddings_offset,
+        'doc_offsets_offset': doc_offsets_offset,
+        'meta_offsets_offset': meta_offsets_offset,
+        'documents_offset': documents_offset,
+        'metadata_offset': metadata_offset,
+        'arrays': array_layout,
+        'file_size': end,
+        'created_at': time.time(),
+        'meta': meta or {}
+    }, ensure_ascii=False).encode('utf-8')
+    if _PREFIX.size + len(header) > HEADER_SIZE:
+        raise ValueError("Заголовок индекса не помещается в отведенный блок")
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREFIX.pack(INDEX_MAGIC, INDEX_VERSION, len(header)))
+            f.write(header)
+            f.write(b'\0' * (HEADER_SIZE - _PREFIX.size - len(header)))
+            f.write(embeddings.tobytes())
+            f.write(b'\0' * (doc_offsets_offset - embeddings_offset - embeddings.nbytes))
+            f.write(doc_offsets.tobytes())
+            f.write(meta_offsets.tobytes())
+            f.write(doc_blob)
+            f.write(meta_blob)
+            position = metadata_offset + len(meta_blob)
+            for name, array in arrays.items():
+                f.write(b'\0' * (array_layout[name]['offset'] - position))
+                f.write(array.tobytes())
+                position = array_layout[name]['offset'] + array.nbytes
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def read_header(path):
+    """Заголовок индекса без чтения данных"""
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise IndexFormatError(f"{path}: файл слишком короткий")
+        magic, version, header_length = _PREFIX.unpack(prefix)
+        if magic != INDEX_MAGIC:
+            raise IndexFormatError(f"{path}: не файл индекса")
+        if version not in SUPPORTED_VERSIONS:
+            raise IndexFormatError(f"{path}: неподдерживаемая версия формата {version}")
+        try:
+            header = json.loads(f.read(header_length))
+        except json.JSONDecodeError as e:
+            raise IndexFormatError(f"{path}: поврежден заголовок ({e})")
+
+    if os.path.getsize(path) != header['file_size']:
+        raise IndexFormatError(f"{path}: размер файла не совпадает с заголовком")
+    return header
+
+
+def open_index(path):
+    """Открытие индекса через mmap: (эмбеддинги, документы, метаданные, массивы, заголовок).
+
+    Данные не копируются в память процесса, поэтому несколько процессов бота
+    на одном хосте разделяют одни и те же страницы.
+    """
+    header = read_header(path)
+    count, dim = header['count'], header['dim']
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+
+    embeddings = np.ndarray((count, dim), dtype='<f4', buffer=raw, offset=header['embeddings_offset'])
+    doc_offsets = np.ndarray((count + 1,), dtype='<u8', buffer=raw, offset=header['doc_offsets_offset'])
+    meta_offsets = np.ndarray((count + 1,), dtype='<u8', buffer=raw, offset=header['meta_offsets_offset'])
+
+    documents = _BlobSequence(raw, doc_offsets, header['documents_offset'], lambda data: data.decode('utf-8'))
+    metadata = _BlobSequence(raw, meta_offsets, header['metadata_offset'], json.loads)
+    arrays = {
+        name: np.ndarray(tuple(layout['shape']), dtype=layout['dtype'], buffer=raw, offset=layout['offset'])
+        for name, layout in header.get('arrays', {}).items()
+    }
+    return embeddings, documents, metadata, arrays, header
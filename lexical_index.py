@@ -0,0 +1,144 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# Коды вида 09.04.01 остаются одним токеном, остальное - слова
+_TOKEN = re.compile(r'\d+(?:\.\d+)+|\w+')
+_RUSSIAN_ENDING = re.compile(
+    r'(иями|ями|ами|ого|его|ому|ему|ыми|ими|ция|ции|цию|ией|ая|яя|ое|ее|ые|ие|ой|ей|ий|ый|ом|ем|ам|ям|ах|ях|ов|ев'
+    r'|ую|юю|а|я|о|е|ы|и|у|ю|ь)$'
+)
+
+
+def tokenize(text):
+    """Токены для BM25: нижний регистр, ё -> е, грубое отсечение русских окончаний"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower().replace('ё', 'е')):
+        if len(token) > 4 and token.isalpha():
+            token = _RUSSIAN_ENDING.sub('', token)
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Инвертированный индекс BM25 в памяти процесса.
+
+    Вес BM25 пары (термин, документ) от запроса не зависит, поэтому считается
+    при построении: поиск сводится к сумме готовых весов по терминам запроса.
+    Постинги хранятся плоскими массивами (термины отсортированы, для термина -
+    срез номеров документов и весов), поэтому сохраняются в файл индекса через
+    to_arrays() и открываются from_arrays() без перестроения.
+    """
+
+    name = 'bm25'
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = 0
+        self._terms = np.zeros(0, dtype=np.uint8)
+        self._term_offsets = np.zeros(1, dtype=np.uint64)
+        self._posting_offsets = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+        self._weights = np.zeros(0, dtype=np.float32)
+
+    def build(self, documents):
+        postings = {}
+        lengths = []
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(count)
+
+        self.size = len(lengths)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size else 0.0
+        terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+        doc_ids = []
+        weights = []
+        for term in terms:
+            term_doc_ids = np.asarray(postings[term][0], dtype=np.int64)
+            tf = np.asarray(postings[term][1], dtype=np.float32)
+            idf = np.log(1.0 + (self.size - len(term_doc_ids) + 0.5) / (len(term_doc_ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[term_doc_ids] / avg_length)
+            doc_ids.append(term_doc_ids)
+            weights.append((idf * tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32))
+
+        encoded = [term.encode('utf-8') for term in terms]
+        self._terms = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self._term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum([len(term) for term in encoded], out=self._term_offsets[1:])
+        self._posting_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in doc_ids], out=self._posting_offsets[1:])
+        self._doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int64)
+        self._weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+
+    def to_arrays(self):
+        """Массивы для сохранения в файле индекса"""
+        return {
+            'bm25_size': np.array([self.size], dtype=np.int64),
+            'bm25_terms': self._terms,
+            'bm25_term_offsets': self._term_offsets,
+            'bm25_posting_offsets': self._posting_offsets,
+            'bm25_doc_ids': self._doc_ids,
+            'bm25_weights': self._weights
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Индекс поверх массивов to_arrays() (в том числе отображенных в память) или None, если их нет"""
+        if 'bm25_size' not in arrays:
+            return None
+        index = cls()
+        index.size = int(arrays['bm25_size'][0])
+        index._terms = arrays['bm25_terms']
+        index._term_offsets = arrays['bm25_term_offsets']
+        index._posting_offsets = arrays['bm25_posting_offsets']
+        index._doc_ids = arrays['bm25_doc_ids']
+        index._weights = arrays['bm25_weights']
+        return index
+
+    def _term(self, position):
+        start, end = int(self._term_offsets[position]), int(self._term_offsets[position + 1])
+        return self._terms[start:end].tobytes()
+
+    def _posting(self, term):
+        """(номера документов, веса) термина или None; двоичный поиск по отсортированным терминам"""
+        key = term.encode('utf-8')
+        low, high = 0, len(self._term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self._term_offsets) - 1 or self._term(low) != key:
+            return None
+        start, end = self._posting_offsets[low], self._posting_offsets[low + 1]
+        return self._doc_ids[start:end], self._weights[start:end]
+
+    def search(self, query, top_k, rows=None):
+        """(номера документов, веса BM25) по убыванию; только документы с ненулевым весом"""
+        if top_k <= 0 or not self.size:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._posting(term)
+            if posting is not None:
+                doc_ids, weights = posting
+                scores[doc_ids] += weights
+
+        if rows is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[rows] = True
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return order, scores[order]
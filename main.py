@@ -1,13 +1,22 @@
+import argparse
 import asyncio
 import logging
 import os
 import re
+import time
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 from data_parser import DataParser
 from vector_db import VectorDB
 from ai_assistant import AIAssistant
+from http_client import close_http_client
+from metrics import MetricsServer, get_metrics
+from request_scheduler import RequestScheduler, RequestSuperseded, SchedulerBusy
+from response_cache import SemanticResponseCache
+from search_batcher import SearchBatcher
+from session_store import SessionStore, UserSession
+from telegram_stream import StreamingReply, reply_markdown
 
 load_dotenv()
 
@@ -17,6 +26,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SEARCH_TOP_K = 5
+
 #Анализатор контекста сгенерирован ИИ
 class ContextAnalyzer:
     """Анализатор контекста пользователя"""
@@ -66,63 +77,164 @@ class ContextAnalyzer:
             'product_development': r'\b(продукт|product|пользователи|метрики|growth|mvp)\b',
             'research': r'\b(исследования|наука|научная|статьи|публикации|конференции)\b'
         }
-    
+
+        # Фильтры поиска: программа и типы документов, если вопрос явно о них
+        self.program_patterns = {
+            'ai_product': re.compile(r'ai[ -]?product|ии[ -]продукт|управлени\w* ии', re.IGNORECASE),
+            'ai': re.compile(r'программ\w* [«"]?искусственн\w* интеллект', re.IGNORECASE)
+        }
+        self.topic_patterns = {
+            # Не просто "стоит": "стоит ли", "стоит выбрать" - это вопросы о выборе программы
+            'cost': re.compile(r'стоимост|сколько стоит|\bцен[аы]|оплат', re.IGNORECASE),
+            'direction': re.compile(r'бюджетн\w* мест|контрактн\w* мест|направлени\w* подготовки|квот', re.IGNORECASE),
+            'admission_method': re.compile(r'поступ|экзамен|олимпиад|портфолио', re.IGNORECASE),
+            'career': re.compile(r'карьер|трудоустро|зарплат|работ\w* после', re.IGNORECASE),
+            'curriculum': re.compile(r'дисциплин|учебн\w* план|предмет|курс[ыао]', re.IGNORECASE)
+        }
+
+        self._compile_keyword_matcher()
+
+    def _compile_keyword_matcher(self):
+        """Сборка всех шаблонов профиля в одно регулярное выражение.
+
+        Каждый шаблон - это \\b(слово|слово|...)\\b, поэтому его альтернативы
+        объединяются в общий список ключевых слов. Для каждого слова заранее
+        вычисляется набор категорий, чьи шаблоны находятся в нем самом: так
+        совпадение "data scientist" засчитывает и "data", а слова, общие для
+        нескольких категорий (pandas, метрики), засчитываются всем сразу.
+        Поиск идет через lookahead, поэтому перекрывающиеся совпадения
+        тоже не теряются.
+        """
+        groups = []
+        for category, patterns in self.background_patterns.items():
+            groups.extend((('background', category), pattern) for pattern in patterns)
+        groups.extend((('experience', level), pattern) for level, pattern in self.experience_patterns.items())
+        groups.extend((('interest', interest), pattern) for interest, pattern in self.interest_patterns.items())
+
+        compiled = [(tag, re.compile(pattern)) for tag, pattern in groups]
+        fragments = {}
+        for tag, pattern in groups:
+            body = re.fullmatch(r'\\b\((.*)\)\\b', pattern).group(1)
+            for fragment in body.split('|'):
+                fragments.setdefault(fragment, set()).add(tag)
+
+        self.keyword_categories = {}
+        for fragment, tags in fragments.items():
+            keyword = re.sub(r'\\(.)', r'\1', fragment)
+            self.keyword_categories[keyword] = frozenset(
+                tags | {tag for tag, regex in compiled if regex.search(keyword)}
+            )
+
+        # Длинные слова раньше коротких: из совпадающих в одной позиции берется самое длинное
+        alternation = '|'.join(sorted(fragments, key=lambda fragment: (-len(fragment), fragment)))
+        self.keyword_pattern = re.compile(rf'(?=\b({alternation})\b)')
+
     def analyze_message(self, message: str) -> dict:
         """Анализ сообщения для извлечения информации о пользователе"""
-        message_lower = message.lower()
-        
-        analysis = {
-            'background': {},
-            'experience_level': None,
-            'interests': [],
-            'education_mentioned': False
+        found = set()
+        for match in self.keyword_pattern.finditer(message.lower()):
+            found |= self.keyword_categories[match.group(1)]
+
+        background = {category: ('background', category) in found for category in self.background_patterns}
+        education_mentioned = background.pop('education')
+
+        return {
+            'background': background,
+            'experience_level': next(
+                (level for level in self.experience_patterns if ('experience', level) in found), None
+            ),
+            'interests': [interest for interest in self.interest_patterns if ('interest', interest) in found],
+            'education_mentioned': education_mentioned
         }
 
-        for category, patterns in self.background_patterns.items():
-            detected = any(re.search(pattern, message_lower, re.IGNORECASE) for pattern in patterns)
-            if category == 'education':
-                analysis['education_mentioned'] = detected
-            else:
-                analysis['background'][category] = detected
+    def detect_search_filters(self, message: str) -> dict:
+        """Фильтры для VectorDB.search, если вопрос явно об одной программе или теме"""
+        filters = {}
 
-        for level, pattern in self.experience_patterns.items():
-            if re.search(pattern, message_lower, re.IGNORECASE):
-                analysis['experience_level'] = level
-                break
+        programs = [key for key, pattern in self.program_patterns.items() if pattern.search(message)]
+        if len(programs) == 1:
+            filters['program'] = programs[0]
 
-        for interest, pattern in self.interest_patterns.items():
-            if re.search(pattern, message_lower, re.IGNORECASE):
-                analysis['interests'].append(interest)
-        
-        return analysis
+        types = {doc_type for doc_type, pattern in self.topic_patterns.items() if pattern.search(message)}
+        if types:
+            # FAQ часто отвечает на те же вопросы, его не отсекаем
+            filters['types'] = types | {'faq'}
+
+        return filters
+
+def fill_search_results(filtered_docs, all_docs, top_k):
+    """Выдача с фильтром, дополненная до top_k документами из поиска без фильтра"""
+    seen = {doc['id'] for doc in filtered_docs}
+    extra = [doc for doc in all_docs if doc['id'] not in seen]
+    return filtered_docs + extra[:max(0, top_k - len(filtered_docs))]
 
 class ITMOChatBot:
-    def __init__(self):
+    def __init__(self, rebuild=False):
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         if not self.bot_token:
             raise ValueError("TELEGRAM_BOT_TOKEN не найден в переменных окружения! "
                            "Убедитесь, что создан .env файл с токеном.")
         
         self.vector_db = VectorDB()
+        self.search_batcher = SearchBatcher.from_env(self.vector_db)
+        self.response_cache = SemanticResponseCache.from_env()
         self.ai_assistant = AIAssistant()
         self.context_analyzer = ContextAnalyzer()
-        self.user_contexts = {} 
+        self.sessions = SessionStore.from_env()
+        self.scheduler = RequestScheduler.from_env()
+        self.admin_user_ids = {int(value) for value in os.getenv('ADMIN_USER_IDS', '').split(',') if value.strip()}
+        self.metrics = get_metrics()
+        self._register_metrics()
+        metrics_port = os.getenv('METRICS_PORT', '')
+        self.metrics_server = (
+            MetricsServer(self.metrics, os.getenv('METRICS_HOST', '127.0.0.1'), int(metrics_port))
+            if metrics_port else None
+        )
+        self.stream_responses = os.getenv('STREAM_RESPONSES', '1') == '1'
+        self.edit_interval = float(os.getenv('TELEGRAM_EDIT_INTERVAL', '1.0'))
         self.initialized = False
+        self.rebuild = rebuild
+        self.started_at = time.perf_counter()
+        self.first_response_logged = False
         
+    def _register_metrics(self):
+        """Статистика компонентов в общем реестре метрик"""
+        self.metrics.register('vector_db', self.vector_db.stats)
+        self.metrics.register('query_cache', self.vector_db.query_cache.stats)
+        self.metrics.register('search_batcher', self.search_batcher.stats)
+        self.metrics.register('response_cache', self.response_cache.stats)
+        self.metrics.register('context_builder', self.ai_assistant.context_builder.stats)
+        self.metrics.register('sessions', self.sessions.stats)
+        self.metrics.register('scheduler', self.scheduler.stats)
+        for flight in (self.vector_db.embed_flight, self.search_batcher.flight, self.ai_assistant.generation_flight):
+            self.metrics.register(f'single_flight_{flight.name}', flight.stats)
+
     async def initialize_data(self):
-        """Инициализация"""
+        """Инициализация: загрузка сохраненной базы или полная пересборка"""
         if self.initialized:
             return
             
         logger.info("Инициализация данных бота...")
+        init_started = time.perf_counter()
         
         try:
-            parser = DataParser()
-            programs_data, curriculum = await parser.parse_programs()
-            await self.vector_db.create_database(programs_data,  curriculum)
+            if self.rebuild:
+                stale_reason = "запрошена пересборка (--rebuild)"
+            else:
+                stale_reason = self.vector_db.get_stale_reason()
+
+            if stale_reason is None and await self.vector_db.load_database():
+                logger.info(f"Векторная база загружена с диска: {len(self.vector_db.documents)} документов")
+            else:
+                logger.info(f"Полная пересборка базы: {stale_reason or 'не удалось загрузить сохраненную базу'}")
+                parser = DataParser()
+                programs_data, curricula = await parser.parse_programs()
+                await self.vector_db.create_database(programs_data, curricula)
             
             self.initialized = True
-            logger.info("Данные готовы!")
+            self.rebuild = False
+            logger.info(f"Данные готовы за {time.perf_counter() - init_started:.2f} с "
+                        f"({time.perf_counter() - self.started_at:.2f} с с момента запуска)")
             
         except Exception as e:
             logger.error(f"Ошибка инициализации данных: {e}")
@@ -136,13 +248,7 @@ class ITMOChatBot:
                 await self.initialize_data()
             
             user_id = update.effective_user.id
-            self.user_contexts[user_id] = {
-                'stage': 'start', 
-                'background': {},
-                'experience_level': None,
-                'interests': [],
-                'message_history': []
-            }
+            await self.sessions.reset(user_id)
 
             keyboard = [
             ["/start", "/help"],
@@ -200,13 +306,13 @@ class ITMOChatBot:
         """Показать профиль пользователя"""
         try:
             user_id = update.effective_user.id
+            user_context = await self.sessions.get(user_id, create=False)
             
-            if user_id not in self.user_contexts:
+            if user_context is None:
                 await update.message.reply_text("Сначала напишите /start")
                 return
             
-            user_context = self.user_contexts[user_id]
-            background = user_context.get('background', {})
+            background = user_context.background
             
             if not any(background.values()):
                 profile_text = "📋 *Ваш профиль пуст*\n\nРасскажите о своем опыте для персональных рекомендаций!"
@@ -222,13 +328,13 @@ class ITMOChatBot:
                 if background.get('ml_experience'):
                     profile_parts.append("🤖 Опыт машинного обучения")
                 
-                if user_context.get('experience_level'):
+                if user_context.experience_level:
                     level_emoji = {'junior': '🌱', 'middle': '📈', 'senior': '🚀'}
-                    level = user_context['experience_level']
+                    level = user_context.experience_level
                     profile_parts.append(f"{level_emoji.get(level, '📊')} Уровень: {level}")
                 
-                if user_context.get('interests'):
-                    interests = ', '.join(user_context['interests'])
+                if user_context.interests:
+                    interests = ', '.join(user_context.interests)
                     profile_parts.append(f"🎯 Интересы: {interests}")
                 
                 profile_text = "\n".join(profile_parts)
@@ -242,87 +348,189 @@ class ITMOChatBot:
         """Сброс контекста пользователя"""
         try:
             user_id = update.effective_user.id
-            self.user_contexts[user_id] = {
-                'stage': 'start', 
-                'background': {},
-                'experience_level': None,
-                'interests': [],
-                'message_history': []
-            }
+            await self.sessions.reset(user_id)
             await update.message.reply_text("🔄 Контекст сброшен. Можете начать заново!")
             
         except Exception as e:
             logger.error(f"Ошибка в reset_command: {e}")
     
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Метрики бота для администраторов из ADMIN_USER_IDS"""
+        try:
+            if update.effective_user.id not in self.admin_user_ids:
+                return
+            await update.message.reply_text(self.metrics.format_report())
+
+        except Exception as e:
+            logger.error(f"Ошибка в stats_command: {e}")
+
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработка текстовых сообщений"""
+        """Обработка текстовых сообщений через планировщик: по одному на пользователя, с общим лимитом"""
         try:
+            received_at = time.perf_counter()
             if not self.initialized:
                 await update.message.reply_text("Инициализация бота, подождите немного...")
                 await self.initialize_data()
-            
-            user_id = update.effective_user.id
-            message = update.message.text
-
-            if user_id not in self.user_contexts:
-                self.user_contexts[user_id] = {
-                    'stage': 'start', 
-                    'background': {},
-                    'experience_level': None,
-                    'interests': [],
-                    'message_history': []
-                }
-            
-            self.user_contexts[user_id]['message_history'].append(message)
- 
-            analysis = self.context_analyzer.analyze_message(message)
-            self._update_user_context(user_id, analysis)
-   
-            relevant_docs = await self.vector_db.search(message)
-
-            response = await self.ai_assistant.generate_response(
-                message, 
-                relevant_docs, 
-                self.user_contexts[user_id]
+
+            # Длительность пишется только для обработанных сообщений: отказы SchedulerBusy
+            # приходят за микросекунды и занижали бы p50/p95 как раз при перегрузке
+            started = time.perf_counter()
+            await self.scheduler.run(
+                update.effective_user.id,
+                lambda: self._process_message(update, received_at)
             )
-            
-            await update.message.reply_text(response, parse_mode='Markdown')
-            
+            self.metrics.observe('stage_seconds', time.perf_counter() - started, stage='message')
+
+        except SchedulerBusy as e:
+            self.metrics.inc('rejected_messages_total', reason=e.reason)
+            if e.reason == 'user':
+                await update.message.reply_text("⏳ Я еще отвечаю на ваши предыдущие вопросы, подождите немного.")
+            else:
+                await update.message.reply_text("⏳ Сейчас слишком много запросов, попробуйте через минуту.")
+        except RequestSuperseded:
+            logger.info(f"Запрос пользователя {update.effective_user.id} отменен новым сообщением")
         except Exception as e:
+            self.metrics.inc('failed_messages_total')
             logger.error(f"Ошибка обработки сообщения: {e}")
             await update.message.reply_text(
                 "Извините, произошла ошибка. Попробуйте переформулировать вопрос."
             )
+
+    async def _process_message(self, update: Update, received_at: float):
+        """Поиск контекста и ответ на сообщение"""
+        user_id = update.effective_user.id
+        message = update.message.text
+
+        user_context = await self.sessions.get(user_id)
+        user_context.message_history.append(message)
+
+        with self.metrics.span('analyze'):
+            analysis = self.context_analyzer.analyze_message(message)
+            self._update_user_context(user_context, analysis)
+            self.sessions.mark_dirty(user_context)
+            search_filters = self.context_analyzer.detect_search_filters(message)
+
+        with self.metrics.span('search'):
+            relevant_docs = await self.search_batcher.search(message, SEARCH_TOP_K, **search_filters)
+            if search_filters and len(relevant_docs) < SEARCH_TOP_K:
+                # С фильтром нашлось мало: недостающее добирается поиском по всему корпусу
+                all_docs = await self.search_batcher.search(message, SEARCH_TOP_K)
+                relevant_docs = fill_search_results(relevant_docs, all_docs, SEARCH_TOP_K)
+
+        cache_args = self._response_cache_args(message, relevant_docs, user_context)
+        response = self.response_cache.get(*cache_args) if cache_args else None
+
+        if response is not None:
+            # В кэше сырой текст модели: Telegram мог уже отклонить его как Markdown
+            await reply_markdown(update.message, response)
+        else:
+            with self.metrics.span('generate'):
+                if self.stream_responses:
+                    response = await self._stream_reply(update, message, relevant_docs, user_context, received_at)
+                else:
+                    response = await self.ai_assistant.generate_response(
+                        message, 
+                        relevant_docs, 
+                        user_context
+                    )
+                    
+                    await reply_markdown(update.message, response)
+
+            if cache_args:
+                self.response_cache.put(*cache_args, response)
+
+        if not self.first_response_logged:
+            self.first_response_logged = True
+            logger.info(f"Первый ответ отправлен за {time.perf_counter() - received_at:.2f} с "
+                        f"({time.perf_counter() - self.started_at:.2f} с с момента запуска)")
     
-    def _update_user_context(self, user_id: int, analysis: dict):
-        """Обновление контекста пользователя на основе анализа"""
+    async def _stream_reply(self, update: Update, message: str, relevant_docs: list, user_context: UserSession,
+                            received_at: float):
+        """Ответ по мере генерации: сообщение дописывается правками с ограничением частоты"""
+        reply = StreamingReply(update.message, self.edit_interval)
         try:
-            user_context = self.user_contexts[user_id]
+            async for delta in self.ai_assistant.stream_response(message, relevant_docs, user_context):
+                first_chunk = reply.first_chunk_at is None
+                await reply.push(delta)
+                if first_chunk:
+                    self.metrics.observe('stage_seconds', reply.first_chunk_at - received_at, stage='first_token')
+                    logger.info(f"Время до первого токена: {reply.first_chunk_at - received_at:.2f} с")
+        except asyncio.CancelledError:
+            # Планировщик отменил устаревший запрос (USER_REQUEST_MODE=latest)
+            await reply.abort("…\n\n_Ответ прерван: получен новый вопрос._")
+            raise
+        await reply.finish()
+
+        if not reply.text:
+            raise Exception("Модель вернула пустой ответ")
+        return reply.text
 
+    def _response_cache_args(self, message: str, relevant_docs: list, user_context: UserSession):
+        """Ключ кэша ответов: эмбеддинг вопроса, найденные документы, профиль и версия индекса"""
+        query_vector = self.vector_db.cached_query_embedding(message)
+        if query_vector is None:
+            return None
+        return (
+            query_vector,
+            [doc['id'] for doc in relevant_docs],
+            self.ai_assistant.profile_fingerprint(user_context),
+            self.vector_db.index_version
+        )
+
+    def _update_user_context(self, user_context: UserSession, analysis: dict):
+        """Обновление контекста пользователя на основе анализа"""
+        try:
             for category, detected in analysis['background'].items():
                 if detected:
-                    user_context['background'][category] = True
+                    user_context.background[category] = True
             if analysis.get('experience_level'):
-                user_context['experience_level'] = analysis['experience_level']
+                user_context.experience_level = analysis['experience_level']
             if analysis.get('interests'):
-                current_interests = set(user_context.get('interests', []))
+                current_interests = set(user_context.interests)
                 new_interests = set(analysis['interests'])
-                user_context['interests'] = list(current_interests | new_interests)
+                user_context.interests = list(current_interests | new_interests)
             if any(analysis['background'].values()) or analysis.get('experience_level') or analysis.get('interests'):
-                logger.info(f"Обновлен контекст пользователя {user_id}: {user_context}")
+                logger.info(f"Обновлен контекст пользователя {user_context.user_id}: {user_context.to_record()}")
                 
         except Exception as e:
             logger.error(f"Ошибка обновления контекста: {e}")
     
+    async def _post_init(self, application: Application):
+        """Загрузка данных до начала polling"""
+        await self.sessions.start()
+        await self.vector_db.query_cache.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        await self.initialize_data()
+
+    async def _post_shutdown(self, application: Application):
+        """Запись сессий и закрытие HTTP-соединений"""
+        for flight in (self.vector_db.embed_flight, self.search_batcher.flight, self.ai_assistant.generation_flight):
+            logger.info(f"Объединение одинаковых вызовов ({flight.name}): {flight.stats()}")
+        logger.info(f"Планировщик запросов: {self.scheduler.stats()}")
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        await self.sessions.close()
+        await self.vector_db.query_cache.close()
+        await close_http_client()
+
     def run(self):
         """Запуск бота"""
         try:
             logger.info("Создание Telegram Application...")
-            application = Application.builder().token(self.bot_token).build()
+            application = (
+                Application.builder()
+                .token(self.bot_token)
+                .post_init(self._post_init)
+                .post_shutdown(self._post_shutdown)
+                .concurrent_updates(True)
+                .build()
+            )
             application.add_handler(CommandHandler("start", self.start_command))
             application.add_handler(CommandHandler("help", self.help_command))
             application.add_handler(CommandHandler("profile", self.profile_command))
             application.add_handler(CommandHandler("reset", self.reset_command))
+            application.add_handler(CommandHandler("stats", self.stats_command))
             application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
             
             logger.info("Запуск бота...")
@@ -334,9 +542,16 @@ class ITMOChatBot:
             logger.error(f"Ошибка при запуске бота: {e}")
             raise
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Telegram-бот для абитуриентов магистратуры ИТМО")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="заново спарсить сайты и пересоздать векторную базу")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     try:
-        bot = ITMOChatBot()
+        bot = ITMOChatBot(rebuild=args.rebuild)
         bot.run()
         
     except KeyboardInterrupt:
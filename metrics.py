@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'itmo_bot'
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL_SPAN = nullcontext()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Summary:
+    """Распределение значений: квантили по последним window наблюдениям, сумма и число за все время"""
+
+    __slots__ = ('count', 'total', 'window')
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        values = sorted(self.window)
+        if not values:
+            return {q: 0.0 for q in quantiles}
+        return {q: values[min(len(values) - 1, int(len(values) * q))] for q in quantiles}
+
+
+class _Span:
+    __slots__ = ('summary', 'started')
+
+    def __init__(self, summary):
+        self.summary = summary
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.summary.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Метрики процесса: длительности этапов, счетчики и статистика компонентов.
+
+    Длительности этапов пишутся в сводку stage_seconds с меткой stage через
+    span(). Компоненты с методом stats() регистрируются через register(), их
+    числовые значения читаются только при выдаче метрик. При enabled=False
+    span() возвращает общий пустой контекст, а inc() и observe() ничего не
+    делают.
+    """
+
+    def __init__(self, enabled=True, window=2048):
+        self.enabled = enabled
+        self.window = window
+        self._summaries = {}
+        self._counters = {}
+        self._collectors = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv('METRICS_ENABLED', '1') == '1',
+            window=int(os.getenv('METRICS_WINDOW', '2048'))
+        )
+
+    def _summary(self, name, labels):
+        key = (name, _label_key(labels))
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = self._summaries[key] = Summary(self.window)
+        return summary
+
+    def span(self, stage):
+        """Контекст, замеряющий длительность этапа stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self._summary('stage_seconds', {'stage': stage}))
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            self._summary(name, labels).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        if self.enabled:
+            key = (name, _label_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register(self, name, collector):
+        """collector() - словарь статистики компонента (как stats()), выдаются числовые значения"""
+        self._collectors[name] = collector
+
+    def _collect(self):
+        collected = {}
+        for name, collector in self._collectors.items():
+            try:
+                stats = collector()
+            except Exception as e:
+                logger.warning(f"Ошибка сбора метрик {name}: {e}")
+                continue
+            collected[name] = {
+                key: float(value) for key, value in stats.items()
+                if isinstance(value, (int, float))
+            }
+        return collected
+
+    def snapshot(self):
+        """Метрики словарем: длительности этапов в секундах, счетчики и статистика компонентов"""
+        stages = {}
+        for (name, key), summary in sorted(self._summaries.items()):
+            if name == 'stage_seconds':
+                q = summary.quantiles()
+                stages[dict(key)['stage']] = {
+                    'count': summary.count, 'mean': summary.total / summary.count if summary.count else 0.0,
+                    'p50': q[0.5], 'p95': q[0.95], 'p99': q[0.99]
+                }
+        return {
+            'stages': stages,
+            'counters': {f"{name}{_format_labels(key)}": value for (name, key), value in sorted(self._counters.items())},
+            'components': self._collect()
+        }
+
+    def reset(self):
+        """Сброс замеров и счетчиков; зарегистрированные компоненты остаются"""
+        self._summaries.clear()
+        self._counters.clear()
+
+    def render_prometheus(self):
+        """Текстовый формат Prometheus"""
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, key), summary in sorted(self._summaries.items()):
+            metric = f"{PREFIX}_{name}"
+            describe(metric, 'summary')
+            for q, value in summary.quantiles().items():
+                lines.append(f"{metric}{_format_labels(key, [('quantile', q)])} {value:.6f}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {summary.total:.6f}")
+            lines.append(f"{metric}_count{_format_labels(key)} {summary.count}")
+
+        for (name, key), value in sorted(self._counters.items()):
+            metric = f"{PREFIX}_{name}"
+            describe(metric, 'counter')
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+
+        for component, stats in self._collect().items():
+            for key, value in stats.items():
+                metric = f"{PREFIX}_{component}_{key}"
+                describe(metric, 'gauge')
+                lines.append(f"{metric} {value:g}")
+
+        return '\n'.join(lines) + '\n'
+
+    def format_report(self):
+        """Сводка для команды /stats"""
+        lines = ["Этапы, мс (p50 / p95 / p99, число):"]
+        for (name, key), summary in sorted(self._summaries.items()):
+            if name != 'stage_seconds':
+                continue
+            q = summary.quantiles()
+            lines.append(f"  {dict(key)['stage']}: {q[0.5] * 1000:.1f} / {q[0.95] * 1000:.1f} / "
+                         f"{q[0.99] * 1000:.1f}, {summary.count}")
+
+        if self._counters:
+            lines.append("Счетчики:")
+            for (name, key), value in sorted(self._counters.items()):
+                lines.append(f"  {name}{_format_labels(key)}: {value}")
+
+        for component, stats in self._collect().items():
+            values = ', '.join(f"{key}={value:g}" for key, value in stats.items())
+            lines.append(f"{component}: {values}")
+
+        if not self.enabled:
+            lines.insert(0, "Сбор метрик отключен (METRICS_ENABLED=0)")
+        return '\n'.join(lines)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus на asyncio без зависимостей"""
+
+    def __init__(self, metrics, host='127.0.0.1', port=9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Метрики Prometheus: http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.metrics.render_prometheus().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+_shared_metrics = None
+
+
+def get_metrics():
+    """Общий реестр метрик процесса"""
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = Metrics.from_env()
+    return _shared_metrics
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+
+class SchedulerBusy(Exception):
+    """Очередь заполнена: запрос отклонен без обработки.
+
+    reason - 'user' (у пользователя уже слишком много запросов в очереди)
+    или 'global' (заполнена общая очередь).
+    """
+
+    def __init__(self, reason):
+        super().__init__(f"Очередь запросов заполнена ({reason})")
+        self.reason = reason
+
+
+class RequestSuperseded(Exception):
+    """Запрос отменен более новым сообщением того же пользователя"""
+
+
+class _UserQueue:
+    __slots__ = ('lock', 'tasks')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.tasks = []
+
+
+class RequestScheduler:
+    """Планировщик обработки сообщений.
+
+    Сообщения одного пользователя обрабатываются по одному: в режиме serial по
+    очереди (не больше max_user_pending одновременно ожидающих), в режиме latest
+    новое сообщение отменяет еще не отвеченные предыдущие. Всего одновременно
+    обрабатывается не больше max_concurrent запросов, ждать могут не больше
+    max_queue; сверх этого запрос сразу отклоняется с SchedulerBusy.
+    """
+
+    MODES = ('serial', 'latest')
+
+    def __init__(self, max_concurrent=16, max_queue=100, mode='serial', max_user_pending=3, wait_window=1000):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим планировщика: {mode}")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.mode = mode
+        self.max_user_pending = max_user_pending
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._users = {}
+
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.started = 0
+        self.rejected = 0
+        self.superseded = 0
+        self._waits = deque(maxlen=wait_window)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrent=int(os.getenv('MAX_CONCURRENT_REQUESTS', '16')),
+            max_queue=int(os.getenv('REQUEST_QUEUE_SIZE', '100')),
+            mode=os.getenv('USER_REQUEST_MODE', 'serial'),
+            max_user_pending=int(os.getenv('USER_MAX_PENDING', '3'))
+        )
+
+    async def run(self, user_id, func):
+        """Результат await func() после того, как подошла очередь пользователя и освободился слот"""
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserQueue()
+
+        if self.mode == 'latest':
+            for task in user.tasks:
+                task.cancel()
+        elif len(user.tasks) >= self.max_user_pending:
+            self.rejected += 1
+            raise SchedulerBusy('user')
+        # Ожидающие, для которых уже есть свободный слот, очередь не занимают
+        if self.waiting >= self.max_queue + max(0, self.max_concurrent - self.active):
+            self.rejected += 1
+            raise SchedulerBusy('global')
+
+        enqueued = time.perf_counter()
+        started = False
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+
+        async def execute():
+            nonlocal started
+            async with user.lock:
+                async with self._slots:
+                    started = True
+                    self.waiting -= 1
+                    self._waits.append(time.perf_counter() - enqueued)
+                    self.started += 1
+                    self.active += 1
+                    try:
+                        return await func()
+                    finally:
+                        self.active -= 1
+
+        # Отдельная задача: отмена устаревшего запроса не затрагивает обработчик, который его ждет
+        task = asyncio.ensure_future(execute())
+        user.tasks.append(task)
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                task.cancel()
+                raise
+            self.superseded += 1
+            raise RequestSuperseded() from None
+        finally:
+            if not started:
+                self.waiting -= 1
+            user.tasks.remove(task)
+            if not user.tasks and not user.lock.locked():
+                self._users.pop(user_id, None)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'started': self.started,
+            'rejected': self.rejected,
+            'superseded': self.superseded,
+            'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+            'p95_wait': waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        }
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """Кэш ответов LLM: ответ переиспользуется для близкого по эмбеддингу вопроса
+    с тем же набором найденных документов и тем же профилем пользователя"""
+
+    def __init__(self, max_size=500, ttl=3600, threshold=0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.index_version = None
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv('RESPONSE_CACHE_SIZE', '500')),
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+            threshold=float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.95'))
+        )
+
+    @staticmethod
+    def _group_key(doc_ids, profile_fingerprint):
+        return tuple(sorted(doc_ids)), profile_fingerprint
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            if self._entries:
+                self.invalidate()
+            self.index_version = index_version
+
+    def get(self, query_vector, doc_ids, profile_fingerprint, index_version):
+        """Сохраненный ответ или None"""
+        self._check_version(index_version)
+        group = self._groups.get(self._group_key(doc_ids, profile_fingerprint))
+        if not group:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        query_vector = self._normalize(query_vector)
+        best_id, best_score = None, self.threshold
+        for entry_id in list(group):
+            vector, answer, created_at, _ = self._entries[entry_id]
+            if now - created_at > self.ttl:
+                self._remove(entry_id)
+                continue
+            score = float(vector @ query_vector)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        return self._entries[best_id][1]
+
+    def put(self, query_vector, doc_ids, profile_fingerprint, index_version, answer):
+        self._check_version(index_version)
+        group_key = self._group_key(doc_ids, profile_fingerprint)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (self._normalize(query_vector), answer, time.time(), group_key)
+        self._groups.setdefault(group_key, []).append(entry_id)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self):
+        """Сброс кэша (например, после пересборки индекса)"""
+        self._entries.clear()
+        self._groups.clear()
+        self.invalidations += 1
+
+    def _remove(self, entry_id):
+        _, _, _, group_key = self._entries.pop(entry_id)
+        group = self._groups[group_key]
+        group.remove(entry_id)
+        if not group:
+            del self._groups[group_key]
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'invalidations': self.invalidations
+        }
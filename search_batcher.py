@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+from single_flight import SingleFlight
+
+
+class SearchBatcher:
+    """Микробатчинг поиска: запросы, пришедшие в пределах max_wait, выполняются одним VectorDB.search_many.
+
+    Одинаковый запрос, пока прежний такой же еще выполняется, в батч не попадает,
+    а получает его результат.
+    """
+
+    def __init__(self, vector_db, max_wait=0.005, max_batch_size=32):
+        self.vector_db = vector_db
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+        self.flight = SingleFlight('search')
+        self.batches = 0
+        self.queries = 0
+
+    @classmethod
+    def from_env(cls, vector_db):
+        return cls(
+            vector_db,
+            max_wait=float(os.getenv('SEARCH_BATCH_MAX_WAIT_MS', '5')) / 1000,
+            max_batch_size=int(os.getenv('SEARCH_BATCH_MAX_SIZE', '32'))
+        )
+
+    async def search(self, query, top_k=5, min_score=0.2, program=None, types=None):
+        """Поиск как VectorDB.search; ждет не дольше max_wait, пока соберется батч"""
+        key = (top_k, min_score, program, frozenset(types) if types is not None else None)
+        return await self.flight.do((query, *key), lambda: self._enqueue(query, key))
+
+    async def _enqueue(self, query, key):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((query, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch, key):
+        self.batches += 1
+        self.queries += len(batch)
+        try:
+            results = await self.vector_db.search_many([query for query, _ in batch], *key)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'avg_batch_size': self.queries / self.batches if self.batches else 0.0
+        }
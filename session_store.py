@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class UserSession:
+    """Контекст пользователя: профиль и ограниченная история сообщений"""
+
+    user_id: int
+    history_limit: int = 20
+    stage: str = 'start'
+    background: dict = field(default_factory=dict)
+    experience_level: str = None
+    interests: list = field(default_factory=list)
+    message_history: deque = None
+    last_seen: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        self.message_history = deque(self.message_history or (), maxlen=self.history_limit)
+
+    def to_record(self):
+        return {
+            'stage': self.stage,
+            'background': dict(self.background),
+            'experience_level': self.experience_level,
+            'interests': list(self.interests),
+            'message_history': list(self.message_history),
+            'last_seen': self.last_seen
+        }
+
+    @classmethod
+    def from_record(cls, user_id, record, history_limit):
+        return cls(user_id=user_id, history_limit=history_limit, **record)
+
+
+class SessionBackend:
+    """Интерфейс постоянного хранилища сессий"""
+
+    def load(self, user_id):
+        return None
+
+    def save_many(self, records):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Сессии в SQLite: одна строка с JSON-записью на пользователя"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # Запросы выполняются из пула потоков asyncio.to_thread, доступ сериализуется блокировкой
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'user_id INTEGER PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    def load(self, user_id):
+        with self._lock:
+            row = self._db.execute('SELECT record FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, records):
+        now = time.time()
+        rows = [(user_id, json.dumps(record, ensure_ascii=False), now) for user_id, record in records.items()]
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO sessions (user_id, record, updated_at) VALUES (?, ?, ?)', rows
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SessionStore:
+    """Сессии пользователей: LRU в памяти с вытеснением неактивных и отложенной пакетной записью в backend"""
+
+    def __init__(self, backend=None, max_sessions=10000, idle_ttl=3600, history_limit=20,
+                 flush_interval=5.0, flush_batch=100):
+        self.backend = backend or SessionBackend()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_limit = history_limit
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._sessions = OrderedDict()
+        self._dirty = set()
+        # Снимки измененных сессий, вытесненных из памяти до записи в backend
+        self._pending = {}
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+
+        self.evicted = 0
+        self.flushed = 0
+
+    @classmethod
+    def from_env(cls):
+        db_path = os.getenv('SESSION_DB_PATH', 'data/sessions.sqlite')
+        return cls(
+            backend=SQLiteSessionBackend(db_path) if db_path else None,
+            max_sessions=int(os.getenv('SESSION_MAX', '10000')),
+            idle_ttl=float(os.getenv('SESSION_IDLE_TTL', '3600')),
+            history_limit=int(os.getenv('SESSION_HISTORY_LIMIT', '20')),
+            flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', '5'))
+        )
+
+    async def get(self, user_id, create=True):
+        """Сессия пользователя из памяти, backend или новая (None, если create=False и ее нет)"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            record = self._pending.pop(user_id, None)
+            if record is not None:
+                self._dirty.add(user_id)
+            else:
+                record = await asyncio.to_thread(self.backend.load, user_id)
+                # Пока шла загрузка, сессию мог создать параллельный обработчик
+                session = self._sessions.get(user_id)
+            if session is None:
+                if record is not None:
+                    session = UserSession.from_record(user_id, record, self.history_limit)
+                elif create:
+                    session = UserSession(user_id, self.history_limit)
+                    self._dirty.add(user_id)
+                else:
+                    return None
+                self._sessions[user_id] = session
+
+        session.last_seen = time.time()
+        self._sessions.move_to_end(user_id)
+        self._evict()
+        return session
+
+    async def reset(self, user_id):
+        """Новая пустая сессия вместо текущей"""
+        session = UserSession(user_id, self.history_limit)
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        self._pending.pop(user_id, None)
+        self.mark_dirty(session)
+        self._evict()
+        return session
+
+    def mark_dirty(self, session):
+        """Отметить сессию для записи в backend при следующем сбросе"""
+        self._dirty.add(session.user_id)
+        if len(self._dirty) >= self.flush_batch:
+            self._flush_requested.set()
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_seen <= self.idle_ttl:
+                break
+            del self._sessions[user_id]
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                self._pending[user_id] = session.to_record()
+            self.evicted += 1
+
+    async def flush(self):
+        """Запись измененных сессий в backend одним пакетом"""
+        async with self._flush_lock:
+            records = dict(self._pending)
+            for user_id in self._dirty:
+                session = self._sessions.get(user_id)
+                if session is not None:
+                    records[user_id] = session.to_record()
+            self._dirty.clear()
+            if not records:
+                return
+            try:
+                await asyncio.to_thread(self.backend.save_many, records)
+            except Exception as e:
+                logger.error(f"Ошибка записи сессий: {e}")
+                for user_id, record in records.items():
+                    self._pending.setdefault(user_id, record)
+                return
+            for user_id, record in records.items():
+                if self._pending.get(user_id) is record:
+                    del self._pending[user_id]
+            self.flushed += len(records)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            self._evict()
+            await self.flush()
+
+    async def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        self.backend.close()
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'dirty': len(self._dirty) + len(self._pending),
+            'evicted': self.evicted,
+            'flushed': self.flushed
+        }
@@ -0,0 +1,189 @@
+import asyncio
+
+
+class _Flight:
+    """Выполняемый вызов: задача, ключи, которые она вычисляет, и число ожидающих"""
+
+    __slots__ = ('task', 'keys', 'waiters')
+
+    def __init__(self, task, keys):
+        self.task = task
+        self.keys = keys
+        self.waiters = 0
+
+
+class _SharedStream:
+    """Буфер фрагментов потока, который читают несколько потребителей"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.task = None
+        self.readers = 0
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов: пока вызов с ключом выполняется,
+    остальные запросы с тем же ключом ждут его результата, а не повторяют его.
+
+    Вызов выполняется отдельной задачей, поэтому отмена одного из ожидающих
+    не прерывает его для остальных; когда уходит последний ожидающий, вызов
+    отменяется. Результат общий для всех ожидающих и не должен изменяться ими.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._streams = {}
+        self._tasks = set()
+
+        self.calls = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def do(self, key, func):
+        """Результат await func() - общий для всех одновременных вызовов с ключом key"""
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = self._spawn(func())
+            call = self._calls[key] = (task, _Flight(task, [key]))
+            task.add_done_callback(lambda done: self._finish(key, done))
+        future, flight = call
+        return await self._wait({flight}, asyncio.shield(future))
+
+    async def do_many(self, keys, func):
+        """Результаты для списка уникальных keys: ключи, которые уже выполняются, ждут свои вызовы,
+        остальные передаются одним вызовом func(новые_ключи), возвращающим список результатов по порядку"""
+        loop = asyncio.get_running_loop()
+        new_keys = [key for key in keys if key not in self._calls]
+        self.coalesced += len(keys) - len(new_keys)
+        if new_keys:
+            self.calls += 1
+            futures = [loop.create_future() for _ in new_keys]
+            task = self._spawn(func(new_keys))
+            flight = _Flight(task, new_keys)
+            for key, future in zip(new_keys, futures):
+                self._calls[key] = (future, flight)
+                future.add_done_callback(lambda done, key=key: self._finish(key, done))
+            task.add_done_callback(lambda done: self._distribute(done, futures))
+
+        calls = [self._calls[key] for key in keys]
+        return await self._wait(
+            {flight for _, flight in calls},
+            asyncio.gather(*(asyncio.shield(future) for future, _ in calls))
+        )
+
+    async def _wait(self, flights, awaitable):
+        """await awaitable; вызовы flights, у которых не осталось ожидающих, отменяются"""
+        for flight in flights:
+            flight.waiters += 1
+        try:
+            return await awaitable
+        finally:
+            for flight in flights:
+                flight.waiters -= 1
+                if not flight.waiters and not flight.task.done():
+                    self._abandon(flight)
+
+    def _abandon(self, flight):
+        # Ключи освобождаются сразу: новый вызов не должен присоединиться к отменяемому
+        for key in flight.keys:
+            if key in self._calls and self._calls[key][1] is flight:
+                del self._calls[key]
+        self.abandoned += 1
+        flight.task.cancel()
+
+    @staticmethod
+    def _distribute(task, futures):
+        if task.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        error = task.exception()
+        results = None if error else list(task.result())
+        if results is not None and len(results) != len(futures):
+            error = ValueError(f"Ожидалось {len(futures)} результатов, получено {len(results)}")
+        for i, future in enumerate(futures):
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def _finish(self, key, future):
+        if key in self._calls and self._calls[key][0] is future:
+            del self._calls[key]
+        # Исключение получено, даже если все ожидающие уже отменены
+        if not future.cancelled():
+            future.exception()
+
+    async def stream(self, key, factory):
+        """Фрагменты асинхронного генератора factory() - один поток на все одновременные вызовы с ключом key;
+        присоединившийся позже получает уже выданные фрагменты сначала"""
+        shared = self._streams.get(key)
+        if shared is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            shared = _SharedStream()
+            self._streams[key] = shared
+            shared.task = self._spawn(self._pump(key, shared, factory))
+
+        shared.readers += 1
+        try:
+            position = 0
+            while True:
+                changed = shared.changed
+                while position < len(shared.chunks):
+                    yield shared.chunks[position]
+                    position += 1
+                if shared.done:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await changed.wait()
+        finally:
+            shared.readers -= 1
+            if not shared.readers and not shared.done:
+                # Последний читатель ушел (запрос отменен): поток upstream больше не нужен
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+                self.abandoned += 1
+                shared.task.cancel()
+
+    async def _pump(self, key, shared, factory):
+        try:
+            async for chunk in factory():
+                shared.chunks.append(chunk)
+                shared.notify()
+        except Exception as e:
+            shared.error = e
+        finally:
+            shared.done = True
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+            shared.notify()
+
+    def stats(self):
+        total = self.calls + self.coalesced
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'abandoned': self.abandoned,
+            'in_flight': len(self._calls) + len(self._streams),
+            'coalesced_rate': self.coalesced / total if total else 0.0
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import re
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+_INCOMPLETE_LINK = re.compile(r'\[[^\[\]]*(\]\([^)]*)?$')
+
+
+def balance_markdown(text):
+    """Закрытие незавершенной сущности Telegram Markdown (*, _, `, ```) и отбрасывание
+    недописанной ссылки, чтобы промежуточный текст стрима оставался валидной разметкой.
+
+    В Telegram Markdown сущности не вкладываются: внутри открытой сущности
+    остальные маркеры - обычные символы, закрывает ее только такой же маркер.
+    """
+    entity = None
+    i = 0
+    while i < len(text):
+        if entity is None and text[i] == '\\':
+            i += 2
+            continue
+        marker = '```' if text.startswith('```', i) else text[i]
+        if entity is None and marker in ('```', '`', '*', '_'):
+            entity = marker
+        elif marker == entity:
+            entity = None
+        i += len(marker)
+
+    if entity is None:
+        link = _INCOMPLETE_LINK.search(text)
+        if link:
+            text = text[:link.start()]
+        return text
+    return text + ('\n```' if entity == '```' else entity)
+
+
+async def reply_markdown(message, text):
+    """Ответ с разметкой Markdown; если Telegram ее не принимает - обычным текстом, как в StreamingReply"""
+    try:
+        return await message.reply_text(text, parse_mode='Markdown')
+    except BadRequest as e:
+        logger.debug(f"Markdown отклонен Telegram, отправляем без разметки: {e}")
+        return await message.reply_text(text)
+
+
+class StreamingReply:
+    """Ответ, который дописывается правками одного сообщения не чаще edit_interval секунд"""
+
+    def __init__(self, message, edit_interval=1.0):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.text = ''
+        self.sent = None
+        self.first_chunk_at = None
+        self._shown_text = None
+        self._next_edit_at = 0.0
+
+    async def push(self, delta):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.text += delta
+        if time.perf_counter() >= self._next_edit_at:
+            await self._show(balance_markdown(self.text))
+
+    async def finish(self):
+        if not self.text:
+            return
+        await self._show(self.text, final=True)
+
+    async def abort(self, note):
+        """Завершение недописанного ответа пометкой note, если часть уже показана"""
+        if self.sent is None:
+            return
+        self.text = balance_markdown(self.text) + note
+        await self._show(self.text, final=True)
+
+    async def _show(self, text, final=False):
+        if not text.strip() or text == self._shown_text:
+            return
+        try:
+            await self._send(text, parse_mode='Markdown')
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return
+            # Модель выдала разметку, которую Telegram не принимает: показываем как обычный текст
+            logger.debug(f"Markdown отклонен Telegram, отправляем без разметки: {e}")
+            await self._send(text)
+        except RetryAfter as e:
+            if final:
+                await asyncio.sleep(float(e.retry_after))
+                await self._show(text, final=True)
+            else:
+                self._next_edit_at = time.perf_counter() + float(e.retry_after)
+            return
+        self._shown_text = text
+        self._next_edit_at = time.perf_counter() + self.edit_interval
+
+    async def _send(self, text, **kwargs):
+        if self.sent is None:
+            self.sent = await self.message.reply_text(text, **kwargs)
+        else:
+            await self.sent.edit_text(text, **kwargs)
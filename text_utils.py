@@ -0,0 +1,3 @@
+def estimate_tokens(text):
+    """Грубая оценка числа токенов (для русского текста ~3 символа на токен)"""
+    return len(text) // 3 + 1
@@ -1,45 +1,262 @@
+import asyncio
+import glob
+import hashlib
 import json
 import numpy as np
-import requests
-from sklearn.metrics.pairwise import cosine_similarity
 import os
+import time
+from chunking import CurriculumChunker
+from embedding_cache import EmbeddingStore, QueryEmbeddingCache
+from embedding_pipeline import EmbeddingPipeline
+from embedding_providers import make_embedding_provider
+from index_store import IndexFormatError, open_index, read_header, write_index
+from lexical_index import BM25Index
+from metrics import get_metrics
+from single_flight import SingleFlight
+
+INDEX_PATH = 'data/index.vdb'
+METADATA_INDEX_FIELDS = ('program', 'type')
+# Формат до index.vdb (в том же каталоге): тексты и метаданные в JSON, эмбеддинги mistral-embed в .npy
+LEGACY_DOCUMENTS_NAME = 'documents.json'
+LEGACY_EMBEDDINGS_NAME = 'embeddings.npy'
+LEGACY_EMBEDDING_MODEL = 'mistral-embed'
+
+def normalize_rows(matrix):
+    """Нормированная по строкам непрерывная float32-матрица (нулевые строки остаются нулевыми)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+def top_k_indices(scores, top_k):
+    """Индексы top_k наибольших значений по убыванию без полной сортировки"""
+    if top_k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def search_rows(embeddings, query_matrix, top_k, rows):
+    """Точный поиск только по строкам rows (индексы возвращаются в нумерации всей матрицы)"""
+    similarities = query_matrix @ embeddings[rows].T
+    results = []
+    for row in similarities:
+        best = top_k_indices(row, top_k)
+        results.append((rows[best], row[best]))
+    return results
+
+class ExactIndex:
+    """Точный поиск: скалярное произведение запроса со всеми векторами"""
+
+    name = 'exact'
+
+    def __init__(self):
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    def build(self, embeddings):
+        self.embeddings = embeddings
+
+    def to_arrays(self):
+        """Структуры поиска для файла индекса: точному поиску ничего, кроме эмбеддингов, не нужно"""
+        return {}
+
+    def load(self, embeddings, arrays):
+        """Подготовка к поиску по сохраненным структурам; False, если их нужно строить заново"""
+        self.embeddings = embeddings
+        return True
+
+    def search(self, query_matrix, top_k, rows=None):
+        """Для каждого запроса пара (индексы, оценки) top_k ближайших векторов; rows ограничивает кандидатов"""
+        if rows is not None:
+            return search_rows(self.embeddings, query_matrix, top_k, rows)
+        similarities = query_matrix @ self.embeddings.T
+        results = []
+        for row in similarities:
+            indices = top_k_indices(row, top_k)
+            results.append((indices, row[indices]))
+        return results
+
+class IVFIndex:
+    """Приближенный поиск IVF: векторы разбиты на кластеры сферическим k-means,
+    запрос сравнивается только с векторами из nprobe ближайших кластеров"""
+
+    name = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, train_size=256, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.train_size = train_size
+        self.seed = seed
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.lists = []
+
+    def _assign(self, vectors, chunk=65536):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assignments[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+        return assignments
+
+    def build(self, embeddings):
+        self.embeddings = embeddings
+        count = len(embeddings)
+        nlist = min(self.nlist or max(1, int(4 * np.sqrt(count))), count) if count else 0
+        if not nlist:
+            self.centroids = np.zeros((0, embeddings.shape[1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+            self.lists = []
+            return
+
+        rng = np.random.default_rng(self.seed)
+        train_count = min(count, nlist * self.train_size)
+        train = np.asarray(embeddings[np.sort(rng.choice(count, train_count, replace=False))])
+        self.centroids = train[rng.choice(train_count, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._assign(train)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, train)
+            empty = np.bincount(assignments, minlength=nlist) == 0
+            # Пустые кластеры перезапускаем со случайных точек обучающей выборки
+            sums[empty] = train[rng.choice(train_count, int(empty.sum()))]
+            self.centroids = normalize_rows(sums)
+
+        assignments = self._assign(embeddings)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+
+    def to_arrays(self):
+        """Центроиды и списки кластеров (номера векторов подряд и границы списков)"""
+        offsets = np.zeros(len(self.lists) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in self.lists], out=offsets[1:])
+        return {
+            'ivf_centroids': np.ascontiguousarray(self.centroids, dtype=np.float32),
+            'ivf_list_offsets': offsets,
+            'ivf_rows': np.concatenate(self.lists).astype(np.int64) if self.lists else np.zeros(0, dtype=np.int64)
+        }
+
+    def load(self, embeddings, arrays):
+        """Кластеры из файла индекса без обучения k-means; False, если их там нет"""
+        if 'ivf_centroids' not in arrays:
+            return False
+        self.embeddings = embeddings
+        self.centroids = arrays['ivf_centroids']
+        offsets = arrays['ivf_list_offsets']
+        rows = arrays['ivf_rows']
+        self.lists = [rows[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return True
+
+    def search(self, query_matrix, top_k, rows=None):
+        if rows is not None:
+            # После фильтра по метаданным кандидатов мало, точный перебор дешевле обхода кластеров
+            return search_rows(self.embeddings, query_matrix, top_k, rows)
+        results = []
+        if not self.lists:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in query_matrix]
+        probes = query_matrix @ self.centroids.T
+        for query, centroid_scores in zip(query_matrix, probes):
+            nearest = top_k_indices(centroid_scores, self.nprobe)
+            candidates = np.concatenate([self.lists[i] for i in nearest])
+            scores = self.embeddings[candidates] @ query
+            best = top_k_indices(scores, top_k)
+            results.append((candidates[best], scores[best]))
+        return results
+
+def make_index_backend(name=None):
+    """Бэкенд поиска по имени (VECTOR_INDEX_BACKEND): exact или ivf"""
+    name = name or os.getenv('VECTOR_INDEX_BACKEND', 'exact')
+    if name == 'exact':
+        return ExactIndex()
+    if name == 'ivf':
+        nlist = os.getenv('IVF_NLIST')
+        return IVFIndex(nlist=int(nlist) if nlist else None, nprobe=int(os.getenv('IVF_NPROBE', '8')))
+    raise ValueError(f"Неизвестный бэкенд векторного поиска: {name}")
 
 class VectorDB:
     def __init__(self):
-        self.mistral_api_key = os.getenv('MISTRAL_API_KEY')
+        self.embedder = make_embedding_provider()
+        if not self.embedder.remote:
+            print(f"Эмбеддинги считаются локально: {self.embedder.name}")
+        self.embedding_model = self.embedder.name
+        self.query_cache = QueryEmbeddingCache.from_env()
+        self.embed_flight = SingleFlight('embeddings')
+        self.index_path = os.getenv('VECTOR_INDEX_PATH', INDEX_PATH)
         self.documents = []
-        self.embeddings = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.index = make_index_backend()
+        self.metadata_index = {}
+        self.index_version = 0
         self.doc_metadata = []
+        self.failed_documents = []
+        self.chunker = CurriculumChunker.from_env()
+
+        # hybrid - векторный поиск + BM25 через reciprocal rank fusion, vector - только векторный,
+        # lexical - только BM25 без обращений к API эмбеддингов
+        self.search_mode = os.getenv('SEARCH_MODE', 'hybrid')
+        if self.search_mode not in ('hybrid', 'vector', 'lexical'):
+            raise ValueError(f"Неизвестный режим поиска: {self.search_mode}")
+        self.lexical_index = BM25Index()
+        self.rrf_k = int(os.getenv('RRF_K', '60'))
+        self.hybrid_candidates = int(os.getenv('HYBRID_CANDIDATES', '20'))
+        # Если эмбеддинг запроса не получен за EMBED_QUERY_TIMEOUT, поиск идет только по BM25,
+        # и следующие LEXICAL_FALLBACK_COOLDOWN секунд API эмбеддингов не вызывается
+        self.embed_query_timeout = float(os.getenv('EMBED_QUERY_TIMEOUT', '5'))
+        self.lexical_fallback_cooldown = float(os.getenv('LEXICAL_FALLBACK_COOLDOWN', '30'))
+        self._embeddings_unavailable_until = 0.0
+        self.lexical_fallbacks = 0
+        self.metrics = get_metrics()
     
-    async def create_database(self, programs_data, curriculum):
-        """Создание векторной базы данных"""
+    async def create_database(self, programs_data, curricula):
+        """Создание векторной базы данных; curricula - учебные планы по ключам программ"""
         documents = []
         metadata = []
         
         print("Создание документов...")
         
         for program_key, program_data in programs_data.items():
-            docs, meta = self._create_documents_from_program(program_key, program_data, curriculum)
+            docs, meta = self._create_documents_from_program(
+                program_key, program_data, curricula.get(program_key, {})
+            )
             documents.extend(docs)
             metadata.extend(meta)
 
         print("Получение эмбеддингов...")
         
-        embeddings = []
-        batch_size = 10
-        
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i+batch_size]
-            try:
-                batch_embeddings = await self._get_embeddings(batch)
-                embeddings.extend(batch_embeddings)
-            except Exception as e:
-                print(f"Ошибка получения эмбеддингов для батча {i//batch_size + 1}: {e}")
-                for _ in batch:
-                    embeddings.append([0] * 1024)  
-        self.documents = documents
-        self.embeddings = np.array(embeddings)
-        self.doc_metadata = metadata
+        store = EmbeddingStore.from_env() if self.embedder.remote else None
+        if store and not os.path.exists(self.index_path):
+            self._import_legacy_embeddings(store)
+        reused = store.get_many(documents, self.embedding_model) if store else {}
+        missing = [i for i in range(len(documents)) if i not in reused]
+
+        pipeline = EmbeddingPipeline.from_env(self._get_embeddings)
+        fetched, failures, stats = await pipeline.run([documents[i] for i in missing])
+        fetched = {missing[i]: vector for i, vector in fetched.items()}
+        failures = {missing[i]: error for i, error in failures.items()}
+
+        if store:
+            store.put_many([documents[i] for i in fetched], self.embedding_model, list(fetched.values()))
+            store.close()
+        print(f"Эмбеддинги: переиспользовано {len(reused)}, запрошено {len(fetched)}, "
+              f"ошибок {len(failures)}, повторов {stats['retries']}, "
+              f"{stats['docs_per_sec']:.1f} док/с")
+
+        # Документы без эмбеддинга не попадают в индекс, а не получают нулевой вектор
+        self.failed_documents = [
+            {'document': documents[i], 'metadata': metadata[i], 'error': error}
+            for i, error in sorted(failures.items())
+        ]
+        for failed in self.failed_documents:
+            print(f"Не удалось получить эмбеддинг [{failed['metadata']['type']}]: {failed['error']}")
+
+        vectors = {**reused, **fetched}
+        kept = [i for i in range(len(documents)) if i in vectors]
+        if documents and not kept:
+            raise Exception("Не удалось получить ни одного эмбеддинга")
+
+        self.documents = [documents[i] for i in kept]
+        self.embeddings = normalize_rows([vectors[i] for i in kept])
+        self.doc_metadata = [metadata[i] for i in kept]
+        self._build_index()
 
         await self._save_database()
         print("Векторная база данных создана и сохранена")
@@ -52,33 +269,16 @@ class VectorDB:
         
         program_title = program_data.get('title', f'Программа {program_key}')
 
-        for courses_types, courses in curriculum.items():
-            titles = [course.get('title', "") for course in courses]
-            semesters = [course.get('semester', "") for course in courses]
-            if courses_types == 'obligatory_courses':
-                name = 'Обязательные курсы: '
-            elif courses_types == 'practices':
-                name = 'Практические курсы: '
-            elif courses_types == 'elective_courses':
-                name = 'Выборные диспицлины: '
-            elif courses_types == 'soft_skills':
-                name = 'Курсы по софт-скилам: '
-            elif courses_types == 'universal_preparation':
-                name = 'Универсальные дисциплины: '
-            elif courses_types == 'gia':
-                name = 'Государственная аттестация: '
-            
-            line = name
-            for title, semester in zip(titles, semesters):
-                line += f'{title} ({semester}), '
-            
-            documents.append(line)
-            metadata.append({
+        for category, courses in curriculum.items():
+            for text, chunk_meta in self.chunker.chunk(program_title, category, courses):
+                documents.append(text)
+                metadata.append({
                     'program': program_key,
                     'type': 'curriculum',
-                    'title': program_title
+                    'title': program_title,
+                    **chunk_meta
                 })
-   
+
         description_data = program_data.get('description', {})
         if isinstance(description_data, dict):
             if description_data.get('lead'):
@@ -255,62 +455,228 @@ class VectorDB:
         return documents, metadata
     
     async def _get_embeddings(self, texts):
-        """Получение эмбеддингов по Mistral API"""
+        """Получение эмбеддингов от провайдера (EMBEDDING_PROVIDER)"""
+        return await self.embedder.embed(texts)
+    
+    async def embed_queries(self, queries):
+        """Эмбеддинги запросов (матрица len(queries) x dim): из кэша или одним вызовом API"""
+        if self.embedder.remote:
+            vectors = await self.query_cache.get_many(queries, self.embedding_model)
+        else:
+            vectors = [None] * len(queries)
+        missing = {}
+        for i, query in enumerate(queries):
+            if vectors[i] is None:
+                missing.setdefault(query, []).append(i)
 
-        if not self.mistral_api_key:
-            print("MISTRAL_API_KEY не найден, используем заглушки")
-            return [[np.random.random(1024).tolist() for _ in texts]]
-        
-        headers = {
-            'Authorization': f'Bearer {self.mistral_api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            'model': 'mistral-embed',
-            'input': texts
+        if missing:
+            # Текст, эмбеддинг которого уже запрошен другим поиском, ждет тот же вызов API
+            keys = [(self.embedding_model, text) for text in missing]
+            embeddings = await self.embed_flight.do_many(keys, self._embed_uncached)
+            for indices, vector in zip(missing.values(), embeddings):
+                for i in indices:
+                    vectors[i] = vector
+
+        return np.vstack(vectors)
+
+    async def _embed_uncached(self, keys):
+        """Эмбеддинги для ключей (модель, текст) одним вызовом API с сохранением в кэш запросов"""
+        texts = [text for _, text in keys]
+        started = time.perf_counter()
+        embeddings = np.asarray(await self._get_embeddings(texts), dtype=np.float32)
+        latency = time.perf_counter() - started
+        if self.embedder.remote:
+            for text, vector in zip(texts, embeddings):
+                self.query_cache.put(text, self.embedding_model, vector, latency=latency)
+                latency = None
+        return list(embeddings)
+
+    def stats(self):
+        return {
+            'documents': len(self.documents),
+            'index_version': self.index_version,
+            'lexical_fallbacks': self.lexical_fallbacks
         }
-        
-        response = requests.post(
-            'https://api.mistral.ai/v1/embeddings',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return [item['embedding'] for item in result['data']]
-        else:
-            raise Exception(f"Ошибка получения эмбеддингов: {response.status_code}, {response.text}")
-    
-    async def search(self, query, top_k=5, min_score=0.2):
-        """Векторный поиск"""
+
+    def cached_query_embedding(self, query):
+        """Эмбеддинг запроса без обращения к API: из памяти кэша или, для локального провайдера, вычисленный сразу"""
+        if not self.embedder.remote:
+            return self.embedder.encode([query])[0]
+        return self.query_cache.get(query, self.embedding_model)
+
+    async def embed_query(self, query):
+        """Эмбеддинг запроса с использованием кэша"""
+        return (await self.embed_queries([query]))[0]
+
+    async def search(self, query, top_k=5, min_score=0.2, program=None, types=None):
+        """Поиск документов; program и types ограничивают поиск документами с такими метаданными"""
+        return (await self.search_many([query], top_k, min_score, program, types))[0]
+
+    async def search_many(self, queries, top_k=5, min_score=0.2, program=None, types=None):
+        """Поиск сразу по нескольким запросам: один вызов API и одно матричное умножение.
+
+        min_score - порог косинусной близости для векторной части поиска.
+        """
 
         if not self.embeddings.size:
             print("База данных пуста")
-            return []
-        
+            return [[] for _ in queries]
+
+        rows = self._filter_rows(program, types)
+        if rows is not None and not len(rows):
+            return [[] for _ in queries]
+
+        query_matrix = None
+        if self.search_mode != 'lexical':
+            with self.metrics.span('embed'):
+                query_matrix = await self._query_matrix(queries)
+        with self.metrics.span('score'):
+            if query_matrix is None:
+                if self.search_mode != 'lexical':
+                    self.lexical_fallbacks += len(queries)
+                return [self._lexical_results(query, top_k, rows) for query in queries]
+
+            # Строки self.embeddings нормированы при загрузке, косинус сводится к скалярному произведению
+            if self.search_mode == 'vector':
+                return [
+                    self._collect_results(indices, scores, min_score)
+                    for indices, scores in self.index.search(query_matrix, top_k, rows)
+                ]
+            candidates = max(top_k, self.hybrid_candidates)
+            return [
+                self._fuse_results(query, indices, scores, top_k, min_score, rows)
+                for query, (indices, scores) in zip(queries, self.index.search(query_matrix, candidates, rows))
+            ]
+
+    async def _query_matrix(self, queries):
+        """Нормированные эмбеддинги запросов или None, если API эмбеддингов недоступен"""
+        if time.monotonic() < self._embeddings_unavailable_until:
+            # API недавно не ответил: без запроса к нему годятся только уже закэшированные эмбеддинги
+            if self.embedder.remote:
+                cached = await self.query_cache.get_many(queries, self.embedding_model)
+            else:
+                cached = [self.cached_query_embedding(query) for query in queries]
+            return normalize_rows(np.vstack(cached)) if all(vector is not None for vector in cached) else None
         try:
-            query_embedding = await self._get_embeddings([query])
-            query_vector = np.array(query_embedding[0]).reshape(1, -1)
+            return normalize_rows(await asyncio.wait_for(self.embed_queries(queries), self.embed_query_timeout))
         except Exception as e:
-            print(f"Ошибка получения эмбеддинга для запроса: {e}")
-            return []
-   
-        similarities = cosine_similarity(query_vector, self.embeddings)[0]
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        
+            print(f"Ошибка получения эмбеддинга для запроса, поиск только по словам: {e!r}")
+            self._embeddings_unavailable_until = time.monotonic() + self.lexical_fallback_cooldown
+            return None
+
+    def _lexical_results(self, query, top_k, rows):
+        indices, scores = self.lexical_index.search(query, top_k, rows)
+        return [self._make_result(idx, score, lexical_score=float(score)) for idx, score in zip(indices, scores)]
+
+    def _fuse_results(self, query, indices, scores, top_k, min_score, rows):
+        """Reciprocal rank fusion векторной и BM25 выдачи: score = сумма 1 / (rrf_k + ранг)"""
+        fused = {}
+        vector_scores = {}
+        lexical_scores = {}
+        for rank, (idx, score) in enumerate((idx, score) for idx, score in zip(indices, scores) if score > min_score):
+            vector_scores[int(idx)] = float(score)
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        lexical_indices, lexical_weights = self.lexical_index.search(query, len(indices) or top_k, rows)
+        for rank, (idx, weight) in enumerate(zip(lexical_indices, lexical_weights)):
+            lexical_scores[int(idx)] = float(weight)
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            self._make_result(idx, score, vector_score=vector_scores.get(idx), lexical_score=lexical_scores.get(idx))
+            for idx, score in best
+        ]
+
+    def _make_result(self, idx, score, **scores):
+        return {
+            'id': int(idx),
+            'document': self.documents[idx],
+            'metadata': self.doc_metadata[idx],
+            'score': float(score),
+            **scores
+        }
+
+    def _collect_results(self, indices, scores, min_score):
         results = []
-        for idx in top_indices:
-            if similarities[idx] > min_score:
-                results.append({
-                    'document': self.documents[idx],
-                    'metadata': self.doc_metadata[idx],
-                    'score': float(similarities[idx])
-                })
+        for idx, score in zip(indices, scores):
+            if score > min_score:
+                results.append(self._make_result(idx, score))
         
         return results
+
+    def _filter_rows(self, program=None, types=None):
+        """Номера документов, подходящих под фильтр, или None без фильтра"""
+        rows = None
+        for field, values in zip(METADATA_INDEX_FIELDS, (program, types)):
+            if values is None:
+                continue
+            values = {values} if isinstance(values, str) else set(values)
+            index = self.metadata_index.get(field, {})
+            matched = [index[value] for value in values if value in index]
+            field_rows = np.unique(np.concatenate(matched)) if matched else np.zeros(0, dtype=np.int64)
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+        return rows
+
+    def _build_metadata_index(self):
+        """Массивы номеров документов для каждого значения program и type"""
+        groups = {field: {} for field in METADATA_INDEX_FIELDS}
+        for i, meta in enumerate(self.doc_metadata):
+            for field, values in groups.items():
+                values.setdefault(meta.get(field), []).append(i)
+        self.metadata_index = {
+            field: {value: np.array(rows, dtype=np.int64) for value, rows in values.items()}
+            for field, values in groups.items()
+        }
+
+    def _metadata_index_arrays(self):
+        """Индекс метаданных для файла индекса: значения (JSON), границы и номера документов по полю"""
+        arrays = {}
+        for field, index in self.metadata_index.items():
+            values = list(index)
+            rows = [index[value] for value in values]
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([len(value_rows) for value_rows in rows], out=offsets[1:])
+            arrays[f'meta_{field}_values'] = np.frombuffer(
+                json.dumps(values, ensure_ascii=False).encode('utf-8'), dtype=np.uint8
+            )
+            arrays[f'meta_{field}_offsets'] = offsets
+            arrays[f'meta_{field}_rows'] = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        return arrays
+
+    def _load_metadata_index(self, arrays):
+        """Индекс метаданных из файла индекса без чтения метаданных документов; False, если его там нет"""
+        if any(f'meta_{field}_values' not in arrays for field in METADATA_INDEX_FIELDS):
+            return False
+        self.metadata_index = {}
+        for field in METADATA_INDEX_FIELDS:
+            values = json.loads(arrays[f'meta_{field}_values'].tobytes().decode('utf-8'))
+            offsets = arrays[f'meta_{field}_offsets']
+            rows = arrays[f'meta_{field}_rows']
+            self.metadata_index[field] = {
+                value: rows[offsets[i]:offsets[i + 1]] for i, value in enumerate(values)
+            }
+        return True
+
+    def _build_index(self, arrays=None):
+        """Построение структур поиска по self.embeddings; arrays - готовые индексы из файла"""
+        started = time.perf_counter()
+        arrays = arrays or {}
+        self.index_version += 1
+        if not self._load_metadata_index(arrays):
+            self._build_metadata_index()
+        # Кластеры IVF обучаются только при создании базы, при загрузке они читаются из файла
+        if not self.index.load(self.embeddings, arrays):
+            self.index.build(self.embeddings)
+            print(f"Индекс {self.index.name} построен за {time.perf_counter() - started:.2f} с")
+        # BM25 нужен и в режиме vector: на нем держится поиск, пока API эмбеддингов недоступен
+        lexical_index = BM25Index.from_arrays(arrays)
+        if lexical_index is None:
+            started = time.perf_counter()
+            lexical_index = BM25Index()
+            lexical_index.build(self.documents)
+            print(f"Индекс BM25 построен за {time.perf_counter() - started:.2f} с")
+        self.lexical_index = lexical_index
     
     def get_programs_summary(self):
         """Получение сводки по программам в базе"""
@@ -334,31 +700,60 @@ class VectorDB:
     
     async def _save_database(self):
         """Сохранение базы данных"""
-        os.makedirs('data', exist_ok=True)
-
-        with open('data/documents.json', 'w', encoding='utf-8') as f:
-            json.dump({
-                'documents': self.documents,
-                'metadata': self.doc_metadata
-            }, f, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
 
-        np.save('data/embeddings.npy', self.embeddings)
+        arrays = {**self._metadata_index_arrays(), **self.lexical_index.to_arrays(), **self.index.to_arrays()}
+        write_index(self.index_path, self.embeddings, self.documents, self.doc_metadata, arrays=arrays, meta={
+            # Неполную базу не считаем актуальной: при следующем запуске недостающие эмбеддинги будут запрошены снова
+            'sources_fingerprint': None if self.failed_documents else self.sources_fingerprint(),
+            'failed_documents': len(self.failed_documents),
+            'embedding_model': self.embedding_model,
+            'chunking': self.chunker.config()
+        })
 
         summary = self.get_programs_summary()
-        with open('data/database_summary.json', 'w', encoding='utf-8') as f:
+        with open(os.path.join(os.path.dirname(self.index_path), 'database_summary.json'), 'w', encoding='utf-8') as f:
             json.dump(summary, f, ensure_ascii=False, indent=2)
         
         print(f"Сохранено: {len(self.documents)} документов, {len(self.embeddings)} эмбеддингов")
     
+    def sources_fingerprint(self):
+        """Хэш исходных данных (programs_data.json и учебные планы)"""
+        digest = hashlib.sha256()
+        paths = ['data/programs_data.json'] + sorted(glob.glob('data/curriculum_*.json'))
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def get_stale_reason(self):
+        """Причина, по которой сохраненную базу нельзя использовать, или None"""
+        for path in (self.index_path, 'data/programs_data.json'):
+            if not os.path.exists(path):
+                return f"отсутствует {path}"
+        try:
+            index_meta = read_header(self.index_path)['meta']
+        except (IndexFormatError, OSError, KeyError) as e:
+            return f"не удалось прочитать индекс: {e}"
+
+        if index_meta.get('failed_documents'):
+            return f"при построении базы не получены эмбеддинги {index_meta['failed_documents']} документов"
+        if index_meta.get('embedding_model') != self.embedding_model:
+            return f"база построена моделью {index_meta.get('embedding_model')}"
+        if index_meta.get('chunking') != self.chunker.config():
+            return "изменились параметры разбиения учебного плана"
+        if index_meta.get('sources_fingerprint') != self.sources_fingerprint():
+            return "исходные данные изменились после построения базы"
+        return None
+
     async def load_database(self):
-        """Загрузка базы данных"""
+        """Загрузка базы данных: индекс отображается в память"""
         try:
-            with open('data/documents.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.documents = data['documents']
-                self.doc_metadata = data['metadata']
-            
-            self.embeddings = np.load('data/embeddings.npy')
+            self.embeddings, self.documents, self.doc_metadata, arrays, _ = open_index(self.index_path)
+            self._build_index(arrays)
             return True
         except FileNotFoundError:
             print("База данных не найдена")
@@ -366,3 +761,34 @@ class VectorDB:
         except Exception as e:
             print(f"Ошибка загрузки базы данных: {e}")
             return False
+
+    def _import_legacy_embeddings(self, store):
+        """Перенос эмбеддингов из documents.json + embeddings.npy в хранилище эмбеддингов документов.
+
+        Старый формат не хранит ни модель, ни хэш исходных данных, поэтому как база
+        он не загружается; при пересборке его эмбеддинги переиспользуются для
+        документов, текст которых не изменился.
+        """
+        if self.embedding_model != LEGACY_EMBEDDING_MODEL:
+            return
+        directory = os.path.dirname(self.index_path)
+        documents_path = os.path.join(directory, LEGACY_DOCUMENTS_NAME)
+        embeddings_path = os.path.join(directory, LEGACY_EMBEDDINGS_NAME)
+        if not (os.path.exists(documents_path) and os.path.exists(embeddings_path)):
+            return
+        try:
+            with open(documents_path, 'r', encoding='utf-8') as f:
+                documents = json.load(f)['documents']
+            embeddings = np.asarray(np.load(embeddings_path), dtype=np.float32)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Не удалось прочитать базу старого формата: {e}")
+            return
+        if len(embeddings) != len(documents):
+            print("Число эмбеддингов не совпадает с числом документов в базе старого формата")
+            return
+        # Старый create_database записывал нулевые векторы вместо не полученных эмбеддингов
+        valid = np.isfinite(embeddings).all(axis=1) & (np.linalg.norm(embeddings, axis=1) > 0)
+        kept = np.flatnonzero(valid)
+        store.put_many([documents[i] for i in kept], self.embedding_model, embeddings[kept])
+        print(f"Эмбеддинги {len(kept)} документов перенесены из базы старого формата"
+              + (f", пропущено нулевых или некорректных: {len(documents) - len(kept)}" if len(kept) < len(documents) else ""))